@@ -0,0 +1,54 @@
+import argparse
+import json
+import os
+import socket
+from assembler_daemon import OUTPUT_FILES, default_socket_path
+
+
+def assemble_files(input_files, output_dir="Output", socket_path=None):
+    """Send source files to the assembler daemon and write the returned outputs.
+
+    Outputs land in output_dir/<program name>/ with the same file names
+    main.py uses, so the client can replace direct main.py runs.
+    """
+    results = {}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path or default_socket_path())
+        reader = sock.makefile('rb')
+        for input_file in input_files:
+            if not os.path.exists(input_file):
+                print(f"Input file not found: {input_file}")
+                continue
+            name = os.path.splitext(os.path.basename(input_file))[0]
+            with open(input_file, 'r') as f:
+                request = {"name": name, "source": f.read(),
+                           "directory": os.path.dirname(os.path.abspath(input_file))}
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            response = json.loads(reader.readline())
+
+            if not response.get("ok"):
+                print(f"Error assembling {input_file}: {response.get('error')}")
+                results[input_file] = None
+                continue
+
+            specific_output_dir = os.path.join(output_dir, name)
+            os.makedirs(specific_output_dir, exist_ok=True)
+            for key, file_name in OUTPUT_FILES.items():
+                with open(os.path.join(specific_output_dir, file_name), 'w') as f:
+                    f.write(response["outputs"][key])
+            print(f"Assembled {input_file} -> {specific_output_dir}")
+            results[input_file] = specific_output_dir
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assemble SIC/XE sources through the assembler daemon")
+    parser.add_argument("inputs", nargs="+", help="source files")
+    parser.add_argument("-o", "--output", default="Output", help="output directory")
+    parser.add_argument("--socket", help="daemon Unix socket path (default: where the daemon puts it)")
+    args = parser.parse_args()
+    assemble_files(args.inputs, args.output, args.socket)
+
+
+if __name__ == "__main__":
+    main()
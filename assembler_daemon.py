@@ -0,0 +1,171 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import socketserver
+import stat
+import tempfile
+import threading
+from main import AssemblyOptions, assemble_program
+from pass1.pass1 import BINARY_DIRECTIVE, expand_includes, tokenize_source
+
+SOCKET_NAME = "sicxe_assembler.sock"
+
+
+def default_socket_path():
+    """The socket in $XDG_RUNTIME_DIR, or else in a per-user folder of the temp directory"""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, SOCKET_NAME)
+    return os.path.join(tempfile.gettempdir(), f"sicxe-assembler-{os.getuid()}", SOCKET_NAME)
+
+
+def check_owned(path, is_type, description):
+    """Return the lstat of path; raise PermissionError unless it is what is_type tests for and ours"""
+    info = os.lstat(path)
+    if not is_type(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"{path} is not {description} owned by you")
+    return info
+
+
+def prepare_socket(socket_path):
+    """Make sure socket_path can be bound without exposing it or deleting someone else's file.
+
+    The default per-user folder is created with mode 0700. A socket left
+    behind by an earlier daemon is removed only when it is ours.
+    """
+    if socket_path == default_socket_path() and not os.environ.get("XDG_RUNTIME_DIR"):
+        directory = os.path.dirname(socket_path)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if check_owned(directory, stat.S_ISDIR, "a folder").st_mode & 0o077:
+            raise PermissionError(f"{directory} is open to other users")
+    if os.path.lexists(socket_path):
+        check_owned(socket_path, stat.S_ISSOCK, "a socket")
+        os.unlink(socket_path)
+
+# Output files returned to clients, keyed by the name used in the response
+OUTPUT_FILES = {
+    "intermediate": "intermediate.txt",
+    "pass1": "out_pass1.txt",
+    "symbols": "symbTable.txt",
+    "xref": "xref.txt",
+    "listing": "out_pass2.txt",
+    "htme": "HTME.txt",
+}
+
+RESULT_CACHE_SIZE = 256
+
+# Sources matching this pull in other files, so their text alone does not identify the result
+INCLUDES = re.compile(r"^[ \t]+(?:COPY|INCLUDE)\s|\bINCBIN\b", re.MULTILINE)
+
+
+class ResultCache:
+    """Recently assembled programs keyed by program name, directory, source hash and include digest"""
+
+    def __init__(self, max_size=RESULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            result = self.results.pop(key, None)
+            if result is not None:
+                self.results[key] = result  # mark as most recently used
+            return result
+
+    def put(self, key, result):
+        with self.lock:
+            self.results[key] = result
+            while len(self.results) > self.max_size:
+                self.results.pop(next(iter(self.results)))
+
+
+def assemble_source(name, source, directory=None):
+    """Assemble source text in memory and return the contents of every output file.
+
+    COPY/INCLUDE and INCBIN paths are relative to directory, the folder of
+    the client's source file (the daemon's working directory when None).
+    """
+    outputs = assemble_program(io.StringIO(source), options=AssemblyOptions(directory=directory))
+    return {key: outputs[file_name] for key, file_name in OUTPUT_FILES.items()}
+
+
+def include_digest(source, directory):
+    """Digest of everything source pulls in with COPY/INCLUDE or INCBIN, None when it has neither.
+
+    The source is expanded through SOURCE_CACHE, which only rereads files
+    whose mtime or size changed; INCBIN files are identified by their
+    mtime and size.
+    """
+    if not INCLUDES.search(source):
+        return None
+    statements = expand_includes(tokenize_source(source.splitlines()), directory or os.getcwd())
+    digest = hashlib.sha1(repr(statements).encode())
+    for statement in statements:
+        if BINARY_DIRECTIVE in statement.parts[:2] and os.path.isfile(statement.parts[-1]):
+            stat = os.stat(statement.parts[-1])
+            digest.update(f"{stat.st_mtime_ns} {stat.st_size}".encode())
+    return digest.hexdigest()
+
+
+class AssemblerHandler(socketserver.StreamRequestHandler):
+    """Handle one client: a JSON request per line, a JSON response per line"""
+
+    def handle(self):
+        for raw in self.rfile:
+            if not raw.strip():
+                continue
+            try:
+                request = json.loads(raw)
+                response = self.server.assemble(request.get("name", "program"), request["source"],
+                                                request.get("directory"))
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class AssemblerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, cache_size=RESULT_CACHE_SIZE):
+        self.cache = ResultCache(cache_size)
+        super().__init__(socket_path, AssemblerHandler)
+
+    def assemble(self, name, source, directory=None):
+        key = (name, directory, hashlib.sha1(source.encode()).hexdigest(), include_digest(source, directory))
+        result = self.cache.get(key)
+        if result is None:
+            result = {"ok": True, "outputs": assemble_source(name, source, directory)}
+            self.cache.put(key, result)
+        return result
+
+
+def serve(socket_path=None, cache_size=RESULT_CACHE_SIZE):
+    socket_path = socket_path or default_socket_path()
+    prepare_socket(socket_path)
+    server = AssemblerServer(socket_path, cache_size)
+    print(f"Assembler daemon listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-running SIC/XE assembler server")
+    parser.add_argument("--socket", help="Unix socket path (default: in $XDG_RUNTIME_DIR or a private temp folder)")
+    parser.add_argument("--cache-size", type=int, default=RESULT_CACHE_SIZE,
+                        help="number of assembled programs kept in memory")
+    args = parser.parse_args()
+    serve(args.socket, args.cache_size)
+
+
+if __name__ == "__main__":
+    main()
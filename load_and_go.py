@@ -0,0 +1,260 @@
+import argparse
+import os
+import re
+from collections import namedtuple
+from pass1.instructionSet import Mnemonic as OPCODE_TABLE
+from pass1.pass1 import (VALID_BLOCKS, INCLUDE_DIRECTIVES, BINARY_DIRECTIVE, AssemblerError,
+                         UnidentifiedSymbolError, parse_literal, parse_literal_value,
+                         calculate_instruction_size, validate_block_name, tokenize_source,
+                         expand_includes, describe_line)
+from pass2.pass2 import encode_statement, is_format_4f, parse_4f_instruction, parse_operand
+from utilities import open_input
+
+# A statement whose object code is waiting for symbols; offset is relative to its block
+Fixup = namedtuple("Fixup", "block offset size instruction operand base line_number")
+
+LoadedProgram = namedtuple("LoadedProgram", "name start image symbols")
+
+NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def operand_references(instruction, operand):
+    """Names (symbols or literals) the encoder will look up for this statement"""
+    entry = OPCODE_TABLE.get(instruction.lstrip('+'))
+    if entry is None or (isinstance(entry, list) and entry[0] in (1, 2)):
+        return []
+    if instruction.lstrip('+') == 'RSUB':
+        return []
+    if is_format_4f(instruction):
+        address = parse_4f_instruction(instruction, operand)[2]
+        return [address] if NAME.match(address) else []
+    mode, value = parse_operand(operand)
+    if not value:
+        return []
+    if value.startswith('=') and mode != 'immediate':
+        return [value]
+    if NAME.match(value):
+        return [value]
+    return []
+
+
+class LoadAndGoAssembler:
+    """One-pass assembler that encodes each statement as soon as it is read.
+
+    Every block is assembled into its own bytearray. A statement whose
+    operand is already defined in the same block is encoded on the spot
+    when PC-relative addressing reaches it, since that encoding does not
+    depend on where the block is finally loaded. Forward references are
+    queued on a per-symbol fixup chain and backpatched when the label is
+    defined. Anything needing absolute addresses (format 4, base-relative,
+    direct, cross-block) is re-encoded at END, once block starts are known
+    and the blocks are laid out into a single memory image.
+    """
+
+    def __init__(self, directory="."):
+        self.directory = directory  # COPY/INCLUDE and INCBIN paths are relative to it
+        self.name = ""
+        self.origin = 0
+        self.blocks = {name: bytearray() for name in VALID_BLOCKS}
+        self.current_block = "DEFAULT"
+        self.symbols = {}       # name -> (block, offset); block None for absolute values
+        self.chains = {}        # undefined name -> [Fixup]
+        self.deferred = []      # fixups resolved at END with absolute addresses
+        self.pending_literals = {}
+        self.base = None
+        self.ended = False
+
+    def define(self, name, block, value):
+        self.symbols[name] = (block, value)
+        for fixup in self.chains.pop(name, []):
+            self.resolve(fixup)
+
+    def resolve(self, fixup):
+        """Encode a fixup now if every reference is known in its block, else queue it again"""
+        refs = operand_references(fixup.instruction, fixup.operand)
+        missing = [name for name in refs if name not in self.symbols]
+        if missing:
+            self.chains.setdefault(missing[0], []).append(fixup)
+            return
+
+        # PC-relative addressing is tried before base-relative, so the base register is not needed here
+        if all(self.symbols[name][0] == fixup.block for name in refs):
+            frame = {name: f"{self.symbols[name][1]:X}" for name in refs}
+            literals = {name: (value, "") for name, value in frame.items() if name.startswith('=')}
+            try:
+                code = encode_statement(f"{fixup.offset:05X}", fixup.instruction, fixup.operand,
+                                        frame, literals)
+            except AssemblerError:
+                pass  # Out of PC-relative reach; END encodes it again with absolute addresses
+            else:
+                if not code:
+                    return
+                if self._position_independent(fixup, code, refs):
+                    self.patch(fixup.block, fixup.offset, code)
+                    return
+
+        self.deferred.append(fixup)
+
+    def _position_independent(self, fixup, code, refs):
+        if not refs:
+            return True
+        # Format 3 with the p bit set; format 4 and direct/base addressing need absolute addresses
+        return len(code) == 6 and int(code[2], 16) & 0b0010 and not fixup.instruction.startswith('+')
+
+    def patch(self, block, offset, code):
+        data = bytes.fromhex(code)
+        self.blocks[block][offset:offset + len(data)] = data
+
+    def emit_literal_pool(self):
+        block = self.blocks[self.current_block]
+        for name, length in self.pending_literals.items():
+            offset = len(block)
+            block.extend(bytes.fromhex(parse_literal_value(name)))
+            self.define(name, self.current_block, offset)
+        self.pending_literals = {}
+
+    def feed(self, line, line_number):
+        """Assemble one source line; a COPY/INCLUDE line assembles the whole included file"""
+        if self.ended:
+            return
+        statements = tokenize_source([line], line_number)
+        if statements and (statements[0].parts[0] in INCLUDE_DIRECTIVES or BINARY_DIRECTIVE in statements[0].parts):
+            # Included files come from the same SOURCE_CACHE pass1 uses
+            statements = expand_includes(statements, self.directory)
+        for statement in statements:
+            self.feed_statement(statement)
+
+    def feed_statement(self, statement):
+        """Assemble one tokenized SourceLine"""
+        if self.ended:
+            return
+        parts = statement.parts
+        line_number = describe_line(statement)
+        has_label = statement.has_label
+        label = parts[0] if has_label else ""
+        components = parts[1:] if has_label else parts
+        instruction = components[0] if components else ""
+        operand = components[-1] if len(components) > 1 else ""
+
+        if instruction == "START":
+            self.name = label
+            self.origin = int(operand, 16) if operand else 0
+            return
+        if instruction == "END":
+            self.emit_literal_pool()
+            self.ended = True
+            return
+        if instruction == "USE":
+            new_block = operand or "DEFAULT"
+            validate_block_name(new_block, line_number)
+            self.current_block = new_block
+            return
+        if instruction == "LTORG":
+            self.emit_literal_pool()
+            return
+        if instruction == "BASE":
+            self.base = operand
+            return
+
+        block = self.blocks[self.current_block]
+        offset = len(block)
+
+        if instruction == "EQU":
+            self.define_equ(label, operand, line_number)
+            return
+        if label:
+            self.define(label, self.current_block, offset)
+
+        if operand.startswith('=') and operand not in self.symbols and operand not in self.pending_literals:
+            self.pending_literals[operand] = parse_literal(operand)
+
+        if instruction == "INCBIN":
+            with open(operand, 'rb') as f:  # expand_includes made the path absolute
+                block.extend(f.read())
+            return
+
+        size = calculate_instruction_size(instruction, operand)
+        block.extend(bytes(size))
+        if instruction in ("RESB", "RESW"):
+            return
+
+        fixup = Fixup(self.current_block, offset, size, instruction, operand, self.base, line_number)
+        self.resolve(fixup)
+
+    def define_equ(self, label, operand, line_number):
+        if operand == "*":
+            self.define(label, self.current_block, len(self.blocks[self.current_block]))
+        elif operand.isdigit():
+            self.define(label, None, int(operand))
+        elif '-' in operand:
+            left, right = operand.split('-', 1)
+            if left not in self.symbols or right not in self.symbols:
+                raise AssemblerError(f"Error at line {line_number}: EQU operands must be defined first")
+            self.define(label, None, self.symbols[left][1] - self.symbols[right][1])
+        elif operand in self.symbols:
+            self.define(label, *self.symbols[operand])
+        else:
+            raise AssemblerError(f"Error at line {line_number}: Unsupported EQU operand '{operand}'")
+
+    def finish(self):
+        """Lay the blocks out, re-encode deferred statements and return the loaded program"""
+        if not self.ended:
+            self.emit_literal_pool()
+        if self.chains:
+            name, fixups = next(iter(self.chains.items()))
+            raise UnidentifiedSymbolError(
+                f"Error at line {fixups[0].line_number}: Undefined symbol '{name}'"
+            )
+
+        starts = {}
+        address = self.origin
+        for name in VALID_BLOCKS:
+            starts[name] = address
+            address += len(self.blocks[name])
+
+        absolute = {}
+        for name, (block, value) in self.symbols.items():
+            absolute[name] = value if block is None else starts[block] + value
+        symbol_table = {name: f"{value:X}" for name, value in absolute.items()}
+        literal_table = {name: (value, "") for name, value in symbol_table.items() if name.startswith('=')}
+
+        image = bytearray().join(self.blocks[name] for name in VALID_BLOCKS)
+        for fixup in self.deferred:
+            location = starts[fixup.block] + fixup.offset
+            base = symbol_table.get(fixup.base) if fixup.base else None
+            code = encode_statement(f"{location:05X}", fixup.instruction, fixup.operand,
+                                    symbol_table, literal_table, base)
+            if code:
+                data = bytes.fromhex(code)
+                start = location - self.origin
+                image[start:start + len(data)] = data
+
+        return LoadedProgram(self.name, self.origin, image, absolute)
+
+
+def load_and_go(input_file):
+    """Assemble input_file in a single streaming read into a memory image"""
+    directory = os.path.dirname(os.path.abspath(input_file)) if isinstance(input_file, str) else "."
+    assembler = LoadAndGoAssembler(directory)
+    with open_input(input_file) as infile:
+        for line_number, line in enumerate(infile, 1):
+            assembler.feed(line, line_number)
+    return assembler.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="One-pass load-and-go SIC/XE assembly")
+    parser.add_argument("input", help="source file")
+    parser.add_argument("-o", "--output", help="write the memory image to this file")
+    args = parser.parse_args()
+
+    program = load_and_go(args.input)
+    print(f"Loaded {program.name} at {program.start:06X}, {len(program.image)} bytes")
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(program.image)
+        print(f"Memory image written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,141 @@
+import argparse
+import io
 import os
+from collections import namedtuple
 from pass1.pass1 import pass1
+from pass1.peephole import write_report
 from pass2.pass2 import pass2
+from pass2.analysis import analyze as analyze_program, write_json_report, write_annotated_listing
 from pass2.Htme import generate_htme_records, extract_block_info
+from pass2.delta import write_delta
+from sinks import AsyncSink, DirectorySink
 
-def run_pass1(input_file, output_dir):
-    os.makedirs(output_dir, exist_ok=True)
-    intermediate_file = os.path.join(output_dir, "intermediate.txt")
-    symb_table_file = os.path.join(output_dir, "symbTable.txt")
-    lc_file = os.path.join(output_dir, "out_pass1.txt")
+OUTPUT_NAMES = ["intermediate.txt", "out_pass1.txt", "symbTable.txt", "xref.txt", "out_pass2.txt", "HTME.txt"]
 
-    print(f"\nRunning Pass 1 for {input_file}...")
+# How to assemble a program; every field is optional:
+#   prefix_sums       pass1 assigns locations with per-block prefix sums
+#   peephole          run the peephole rules (pass1/peephole.py) over the statements
+#   disabled_rules    names of peephole rules to skip
+#   constant_pooling  pool literals and read-only constants by value (pass1/constant_pool.py)
+#   directory         folder COPY/INCLUDE and INCBIN paths are relative to when the source is a stream
+#   vectorized        encode format 3/4 instructions in bulk with NumPy when it is installed
+#   jobs              number of processes pass2 encodes with
+#   analyze           add analysis.json and annotated.txt (pass2/analysis.py)
+#   cost_table        cycle cost table for analyze, the built-in one when None
+#   debug_map         add the binary debug.map (pass2/debug_map.py)
+AssemblyOptions = namedtuple(
+    "AssemblyOptions",
+    "prefix_sums peephole disabled_rules constant_pooling directory vectorized jobs analyze cost_table debug_map",
+    defaults=(False, False, (), False, None, False, 1, False, None, False),
+)
+
+def assemble_program(input_file, sink=None, program=None, options=AssemblyOptions(), previous_htme=None):
+    """Assemble one program in memory and return {output file name: text}.
+
+    When a sink is given the outputs are also written to it under program,
+    including those of the stages that finished before an error. With the
+    previous build's HTME (a path or stream) as previous_htme,
+    HTME.delta.txt holds only the object code that changed (see
+    pass2/delta.py).
+    """
+    buffers = {name: io.StringIO() for name in OUTPUT_NAMES}
     try:
-        pass1(input_file, intermediate_file, symb_table_file, lc_file)
-        print("Pass 1 completed successfully.")
-        return intermediate_file, symb_table_file  # Return files for pass2
-    except Exception as e:
-        print(f"Error during Pass 1: {e}")
-        return None, None
+        result = pass1(input_file, buffers["intermediate.txt"], buffers["symbTable.txt"],
+                       buffers["out_pass1.txt"], buffers["xref.txt"], prefix_sums=options.prefix_sums,
+                       peephole=options.peephole, disabled_rules=options.disabled_rules,
+                       constant_pooling=options.constant_pooling, directory=options.directory)
+        if result.rewrites:
+            buffers["rewrites.txt"] = io.StringIO()
+            write_report(result.rewrites, buffers["rewrites.txt"])
+        if options.debug_map:
+            buffers["debug.map"] = io.BytesIO()
+        encoded = pass2(buffers["intermediate.txt"], buffers["symbTable.txt"], buffers["out_pass2.txt"],
+                        result.statements, vectorized=options.vectorized, jobs=options.jobs,
+                        debug_map_file=buffers.get("debug.map"), symbols=result.symbols)
+        if options.analyze:
+            report, annotations = analyze_program(encoded, options.cost_table)
+            buffers["analysis.json"] = io.StringIO()
+            buffers["annotated.txt"] = io.StringIO()
+            write_json_report(report, buffers["analysis.json"])
+            write_annotated_listing(encoded, report, annotations, buffers["annotated.txt"])
+
+        pass2_content = buffers["out_pass2.txt"].getvalue().splitlines(keepends=True)
+        block_info = extract_block_info(buffers["symbTable.txt"])
+        generate_htme_records(pass2_content, buffers["HTME.txt"], block_info, binaries=result.binaries)
+        if previous_htme is not None:
+            buffers["HTME.delta.txt"] = io.StringIO()
+            changed = write_delta(previous_htme, buffers["HTME.txt"], buffers["HTME.delta.txt"])
+            print(f"{changed} bytes of object code changed since the previous build")
+        return {name: buffer.getvalue() for name, buffer in buffers.items()}
+    finally:
+        if sink is not None:
+            for name, buffer in buffers.items():
+                if buffer.tell():
+                    sink.write(program, name, buffer.getvalue())
+
+def main(input_files=None, output_dir="Output", sink=None, delta=False, options=AssemblyOptions()):
+    """Assemble input_files into output_dir/<program name>/ with the given AssemblyOptions.
+
+    delta=True also writes HTME.delta.txt against the HTME already there.
+    """
+    if input_files is None:
+        input_files = [
+            "input/input.txt"
+        ]
+
+    # Outputs are written in the background while the next program assembles
+    owns_sink = sink is None
+    if owns_sink:
+        sink = AsyncSink(DirectorySink(output_dir))
 
-def run_pass2(intermediate_file, symb_table_file, output_dir):
-    print("\nRunning Pass 2...")
     try:
-        out_file = os.path.join(output_dir, "out_pass2.txt")
-        pass2(intermediate_file, symb_table_file, out_file)
-        print("Pass 2 completed successfully.")
-        print(f"Generated object code file: {out_file}")
-        return out_file
-    except Exception as e:
-        print(f"Error during Pass 2: {e}")
-        return None
+        for input_file in input_files:
+            if os.path.exists(input_file):
+                file_name = os.path.splitext(os.path.basename(input_file))[0]
 
-def main():
-    input_files = [
-        "input/input.txt"
-    ]
-    output_dir = "Output"
+                # The previous object is read now, before the new one is queued for writing
+                previous_htme = None
+                previous_file = os.path.join(output_dir, file_name, "HTME.txt")
+                if delta and os.path.exists(previous_file):
+                    with open(previous_file, 'r') as f:
+                        previous_htme = io.StringIO(f.read())
 
-    for input_file in input_files:
-        if os.path.exists(input_file):
-            file_name = os.path.splitext(os.path.basename(input_file))[0]
-            specific_output_dir = os.path.join(output_dir, file_name)
-            
-            # Run Pass 1
-            intermediate_file, symb_table_file = run_pass1(input_file, specific_output_dir)
-            
-            # Run Pass 2 if Pass 1 was successful
-            if intermediate_file and symb_table_file:
-                pass2_output = run_pass2(intermediate_file, symb_table_file, specific_output_dir)
-                
-                # Generate HTME records
-                if pass2_output:
-                    with open(pass2_output, 'r') as f:
-                        pass2_content = f.readlines()
-                    
-                    block_info = extract_block_info(symb_table_file)
-                    htme_output = os.path.join(specific_output_dir, "HTME.txt")
-                    generate_htme_records(pass2_content, htme_output, block_info)
-                    print(f"Generated HTME records: {htme_output}")
-        
+                print(f"\nAssembling {input_file}...")
+                try:
+                    assemble_program(input_file, sink, file_name, options, previous_htme)
+                    print(f"Assembled {input_file} into {os.path.join(output_dir, file_name)}")
+                except Exception as e:
+                    print(f"Error assembling {input_file}: {e}")
+
+            else:
+                print(f"Input file not found: {input_file}")
+    finally:
+        if owns_sink:
+            sink.close()
         else:
-            print(f"Input file not found: {input_file}")
+            sink.flush()
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Assemble SIC/XE programs")
+    parser.add_argument("inputs", nargs="*", help="source files (default: input/input.txt)")
+    parser.add_argument("-o", "--output", default="Output", help="output directory")
+    parser.add_argument("--delta", action="store_true", help="also write HTME.delta.txt against the last build")
+    parser.add_argument("--prefix-sums", action="store_true", help="assign locations with per-block prefix sums")
+    parser.add_argument("--peephole", action="store_true", help="run the peephole optimizer")
+    parser.add_argument("--disable-rule", action="append", default=[], metavar="RULE",
+                        help="skip this peephole rule (repeatable)")
+    parser.add_argument("--constant-pooling", action="store_true", help="pool constants by value")
+    parser.add_argument("--vectorized", action="store_true", help="encode format 3/4 with NumPy")
+    parser.add_argument("--jobs", type=int, default=1, help="processes used to encode")
+    parser.add_argument("--analyze", action="store_true", help="write size and cycle estimates")
+    parser.add_argument("--debug-map", action="store_true", help="write the binary debug.map")
+    args = parser.parse_args(argv)
+    options = AssemblyOptions(prefix_sums=args.prefix_sums, peephole=args.peephole,
+                              disabled_rules=tuple(args.disable_rule), constant_pooling=args.constant_pooling,
+                              vectorized=args.vectorized, jobs=args.jobs, analyze=args.analyze,
+                              debug_map=args.debug_map)
+    return args.inputs or None, args.output, args.delta, options
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    input_files, output_dir, delta, options = parse_arguments()
+    main(input_files, output_dir, delta=delta, options=options)
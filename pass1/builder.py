@@ -0,0 +1,144 @@
+from .pass1 import SourceLine, VALID_BLOCKS
+
+
+class Immediate:
+    """#value operand; value is a number or a symbol name"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return f"#{self.value}"
+
+
+class Indirect:
+    """@symbol operand"""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def __str__(self):
+        return f"@{self.symbol}"
+
+
+class Indexed:
+    """symbol,X operand"""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def __str__(self):
+        return f"{self.symbol},X"
+
+
+class LiteralOperand:
+    """=X'..' or =C'..' literal; bytes become hex literals, str character literals"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        if isinstance(self.value, (bytes, bytearray)):
+            return f"=X'{self.value.hex().upper()}'"
+        return f"=C'{self.value}'"
+
+
+class RegisterPair:
+    """r1,r2 operand of a format 2 instruction"""
+
+    def __init__(self, r1, r2):
+        self.r1 = r1
+        self.r2 = r2
+
+    def __str__(self):
+        return f"{self.r1},{self.r2}"
+
+
+class Conditional:
+    """register,target,flag operand of a format 4F instruction (flag is Z, N, C or V)"""
+
+    def __init__(self, register, target, flag="N"):
+        self.register = register
+        self.target = target
+        self.flag = flag
+
+    def __str__(self):
+        return f"{self.register},{self.target},{self.flag}"
+
+
+class ProgramBuilder:
+    """Build a SIC/XE program in memory as the SourceLines pass1 consumes.
+
+    Operands may be plain strings, numbers or the operand classes above, so
+    generated code never goes through source text and parse_line. Pass the
+    result of build() wherever pass1 accepts an input file, e.g.
+    assemble_program(builder.build()) in main.py.
+    """
+
+    def __init__(self, name, start=0):
+        self.statements = [SourceLine(1, True, [name, "START", f"{start:04X}"])]
+        self.pending_label = None
+
+    def _add(self, label, parts):
+        label = label or self.pending_label
+        self.pending_label = None
+        if label:
+            parts = [label] + parts
+        self.statements.append(SourceLine(len(self.statements) + 1, bool(label), parts))
+        return self
+
+    def label(self, name):
+        """Attach name to the next statement"""
+        self.pending_label = name
+        return self
+
+    def emit(self, mnemonic, *operands, label=None, extended=False):
+        """Add an instruction; extended=True selects format 4 (+mnemonic)"""
+        if extended and not mnemonic.startswith('+'):
+            mnemonic = '+' + mnemonic
+        parts = [mnemonic]
+        if operands:
+            parts.append(",".join(str(operand) for operand in operands))
+        return self._add(label, parts)
+
+    def use(self, block="DEFAULT"):
+        if block not in VALID_BLOCKS:
+            raise ValueError(f"Unidentified block name '{block}'")
+        return self._add(None, ["USE", block])
+
+    def ltorg(self):
+        return self._add(None, ["LTORG"])
+
+    def base(self, symbol):
+        return self._add(None, ["BASE", str(symbol)])
+
+    def include(self, path):
+        """Splice in a source file when pass1 reads the program"""
+        return self._add(None, ["INCLUDE", str(path)])
+
+    def equ(self, label, value="*"):
+        return self._add(label, ["EQU", str(value)])
+
+    def byte(self, value, label=None):
+        """BYTE constant; bytes become X'..', str becomes C'..'"""
+        if isinstance(value, (bytes, bytearray)):
+            operand = f"X'{value.hex().upper()}'"
+        else:
+            operand = f"C'{value}'"
+        return self._add(label, ["BYTE", operand])
+
+    def word(self, value, label=None):
+        return self._add(label, ["WORD", str(value)])
+
+    def resb(self, count, label=None):
+        return self._add(label, ["RESB", str(count)])
+
+    def resw(self, count, label=None):
+        return self._add(label, ["RESW", str(count)])
+
+    def end(self, first=None):
+        name = self.statements[0].parts[0]
+        return self._add(None, ["END", str(first or name)])
+
+    def build(self):
+        return list(self.statements)
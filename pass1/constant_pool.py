@@ -0,0 +1,253 @@
+from .instructionSet import Mnemonic as OPCODE_TABLE
+from .pass1 import describe_line, parse_literal, parse_literal_value
+from .peephole import Rewrite, split_statement, make_statement, layout, reaches
+from .symbol_index import referenced_symbols
+
+STORES = {"STA", "STB", "STCH", "STF", "STI", "STL", "STS", "STSW", "STT", "STX"}
+JUMPS = {"J", "JEQ", "JGT", "JLT", "JSUB"}
+DATA = {"BYTE", "WORD", "RESB", "RESW", "INCBIN"}
+
+
+def constant_bytes(instruction, operand):
+    """Hex value of a BYTE or numeric WORD constant, None for anything else"""
+    if instruction == "BYTE" and operand.startswith(("X'", "C'")) and operand.endswith("'"):
+        return parse_literal_value('=' + operand).upper()
+    if instruction == "WORD" and operand.isdigit() and int(operand) <= 0xFFFFFF:
+        return f"{int(operand):06X}"
+    return None
+
+
+def literal_bytes(operand):
+    """Hex value of an =X'..' or =C'..' literal, None for anything else"""
+    if operand.startswith(("=X'", "=C'")) and operand.endswith("'"):
+        return parse_literal_value(operand).upper()
+    return None
+
+
+def is_format3(instruction):
+    return isinstance(OPCODE_TABLE.get(instruction.lstrip('+')), str)
+
+
+def reads_only(instruction, operand):
+    """True when the statement only reads the word its operand names"""
+    mnemonic = instruction.lstrip('+')
+    return (is_format3(instruction) and mnemonic not in STORES and mnemonic not in JUMPS
+            and not operand.startswith('#') and ',' not in operand)
+
+
+class ConstantPool:
+    """Pools literals and read-only constants that hold the same bytes.
+
+    Three kinds of change are proposed:
+
+    - a literal whose bytes are also written another way (=C'EOF' and
+      =X'454F46') takes the spelling of its first use, so pass1 stores
+      the value once; literals spelled one way are left as written;
+    - a literal whose value a read-only BYTE/WORD constant already holds
+      is replaced by that constant's label;
+    - duplicate read-only constants are dropped and their labels become
+      EQU aliases of the kept copy.
+
+    The kept copy of each value is the one most users can reach. The
+    program is then laid out again and any change that leaves a format 3
+    user out of range (see reaches in peephole.py) is withdrawn, until every user
+    reaches its target.
+    """
+
+    def __init__(self, statements):
+        self.statements = statements
+        self.rejected_literals = set()   # literal values left as written
+        self.rejected_aliases = set()    # duplicate constant indexes kept
+        self.rejected_redirects = set()  # statement indexes left on their literal
+        self.analyze()
+
+    def analyze(self):
+        statements = self.statements
+        unsafe = set()
+        indexed = set()
+        self.uses = {}
+        self.literal_users = {}
+        self.spellings = {}  # literal value -> operands spelling it, in order of first use
+        for index, statement in enumerate(statements):
+            label, instruction, operand = split_statement(statement)
+            if not operand:
+                continue
+            if instruction == "EQU":
+                unsafe.update(referenced_symbols(operand))
+                continue
+            value = literal_bytes(operand)
+            if value is not None:
+                self.literal_users.setdefault(value, []).append(index)
+                spellings = self.spellings.setdefault(value, [])
+                if operand not in spellings:
+                    spellings.append(operand)
+                continue
+            if ',X' in operand:
+                indexed.add(operand.split(',')[0])
+            for name in referenced_symbols(operand):
+                self.uses.setdefault(name, []).append(index)
+                if not reads_only(instruction, operand):
+                    unsafe.add(name)
+
+        # Walk each block in order; a constant followed by unlabelled data, or
+        # right after data that is read indexed, may be part of a table
+        by_block = {}
+        block = "DEFAULT"
+        for index, statement in enumerate(statements):
+            label, instruction, operand = split_statement(statement)
+            if instruction == "USE":
+                block = operand or "DEFAULT"
+            elif instruction in DATA or (label and instruction not in ("EQU", "START")):
+                by_block.setdefault(block, []).append(index)
+
+        self.constants = {}  # value -> [statement index] in source order
+        for indexes in by_block.values():
+            for position, index in enumerate(indexes):
+                label, instruction, operand = split_statement(statements[index])
+                value = constant_bytes(instruction, operand) if label else None
+                if value is None or label in unsafe or label in indexed:
+                    continue
+                if position + 1 < len(indexes):
+                    next_label, next_instruction, _ = split_statement(statements[indexes[position + 1]])
+                    if not next_label and next_instruction in DATA:
+                        continue
+                if position > 0:
+                    previous_label, _, _ = split_statement(statements[indexes[position - 1]])
+                    if previous_label in indexed:
+                        continue
+                self.constants.setdefault(value, []).append(index)
+        for indexes in self.constants.values():
+            indexes.sort()
+
+    def label_of(self, index):
+        return split_statement(self.statements[index])[0]
+
+    def choose_keepers(self, addresses):
+        """Pick, for each pooled value, the constant the most users can reach"""
+        keepers = {}
+        for value, indexes in self.constants.items():
+            users = [user for index in indexes for user in self.uses.get(self.label_of(index), [])]
+            users += self.literal_users.get(value, [])
+            if len(indexes) < 2 and not self.literal_users.get(value):
+                continue
+
+            def reachable(candidate):
+                return sum(reaches(split_statement(self.statements[user])[1], addresses[user],
+                                   addresses[candidate]) for user in users)
+            keepers[value] = max(indexes, key=lambda candidate: (reachable(candidate), -candidate))
+        return keepers
+
+    def rewrite(self, keepers):
+        """Apply every change not yet rejected; returns (statements, origins, rewrites)"""
+        aliases = {}
+        for value, keeper in keepers.items():
+            for index in self.constants[value]:
+                if index != keeper and index not in self.rejected_aliases:
+                    aliases[index] = self.label_of(keeper)
+        self.aliases = aliases
+        self.respelled = set()  # literal values spelled differently somewhere
+
+        result = []
+        origins = []  # original index of every statement in result, None for added ones
+        rewrites = []
+        for index, statement in enumerate(self.statements):
+            label, instruction, operand = split_statement(statement)
+            if index in aliases:
+                rewrites.append(Rewrite("shared_constant", describe_line(statement),
+                                        f"{label} {instruction} {operand} -> {label} EQU {aliases[index]} "
+                                        f"({len(constant_bytes(instruction, operand)) // 2} bytes)"))
+                continue
+
+            if instruction == "END":
+                # Aliases go last, when every kept constant is defined
+                for alias_index, target in aliases.items():
+                    alias = self.statements[alias_index]
+                    result.append(make_statement(alias, self.label_of(alias_index), "EQU", target))
+                    origins.append(None)
+
+            value = literal_bytes(operand)
+            if value is not None:
+                if value in keepers and index not in self.rejected_redirects:
+                    target = self.label_of(keepers[value])
+                    rewrites.append(Rewrite("literal_to_constant", describe_line(statement),
+                                            f"{instruction} {operand} -> {instruction} {target}"))
+                    statement = make_statement(statement, label, instruction, target)
+                elif value not in self.rejected_literals and operand != self.spellings[value][0]:
+                    canonical = self.spellings[value][0]
+                    self.respelled.add(value)
+                    rewrites.append(Rewrite("canonical_literal", describe_line(statement),
+                                            f"{instruction} {operand} -> {instruction} {canonical}"))
+                    statement = make_statement(statement, label, instruction, canonical)
+            result.append(statement)
+            origins.append(index)
+        return result, origins, rewrites
+
+    def check(self, statements, origins, keepers):
+        """Reject the changes behind any format 3 user that no longer reaches its target.
+
+        Returns True when nothing new had to be rejected. Users that were
+        already out of range before pooling (base-relative ones) cannot be
+        blamed on a change and are left alone.
+        """
+        addresses, symbols, literals = layout(statements)
+        alias_index = {self.label_of(index): index for index in self.aliases}
+        ok = True
+        for position, statement in enumerate(statements):
+            label, instruction, operand = split_statement(statement)
+            index = origins[position]
+            if index is None or not operand or not is_format3(instruction):
+                continue
+            name = operand.lstrip('@')
+            if operand.startswith('='):
+                target = literals.get(operand)
+            elif name in symbols and operand != split_statement(self.statements[index])[2]:
+                target = symbols[name]  # redirected from a literal
+            elif name in alias_index:
+                target = symbols.get(name)
+            else:
+                continue
+            if target is None or reaches(instruction, addresses[position], target):
+                continue
+
+            original = split_statement(self.statements[index])[2]
+            value = literal_bytes(original)
+            if value is not None and value in keepers and index not in self.rejected_redirects:
+                self.rejected_redirects.add(index)
+            elif value is not None and value in self.respelled:
+                self.rejected_literals.add(value)
+            elif name in alias_index:
+                self.rejected_aliases.add(alias_index[name])
+            else:
+                continue
+            ok = False
+        return ok
+
+    def run(self):
+        addresses, _, _ = layout(self.statements)
+        keepers = self.choose_keepers(addresses)
+        while True:
+            statements, origins, rewrites = self.rewrite(keepers)
+            if self.check(statements, origins, keepers):
+                return statements, rewrites
+
+
+def literal_pool_size(statements):
+    names = {operand for _, _, operand in map(split_statement, statements) if operand.startswith('=')}
+    return sum(parse_literal(name) for name in names)
+
+
+def data_size(statements):
+    return sum(len(constant_bytes(instruction, operand) or "") // 2
+               for _, instruction, operand in map(split_statement, statements))
+
+
+def pool_constants(statements):
+    """Pool literals and read-only constants by byte value.
+
+    Returns the rewritten statements, the Rewrites applied and the number
+    of bytes saved.
+    """
+    pooled, rewrites = ConstantPool(statements).run()
+    saved = (literal_pool_size(statements) + data_size(statements)
+             - literal_pool_size(pooled) - data_size(pooled))
+    return pooled, rewrites, saved
@@ -0,0 +1,66 @@
+from collections import namedtuple
+from utilities import open_input, open_output
+
+# One statement of the pass 1 listing; loc and block are integers. line is the
+# source line number and source the included file it is in (None for the main
+# file); the listing files carry neither, so both are None when read back
+ListingRow = namedtuple("ListingRow", "loc block label opcode operand line source", defaults=(None, None))
+
+
+def format_listing_line(loc, block, label, opcode, operand):
+    loc_str = f"{loc:05X}" if loc is not None else "     "
+    block_str = f"{block}"
+    label_str = f"{label:<8}" if label else " " * 8
+    opcode_str = f"{opcode:<8}" if opcode else " " * 8
+    operand_str = f"{operand:<12}" if operand else " " * 12
+
+    formatted_line = f"{loc_str} {block_str} {label_str} {opcode_str} {operand_str}"
+    return formatted_line.rstrip() + "\n"
+
+
+class Listing:
+    """Pass 1 listing that formats each row once and fans it out to every target.
+
+    Targets are paths or open text streams; rows are buffered and written in
+    one go by write(). With no targets rows are not formatted at all. The
+    rows themselves are kept in order so pass 2 can use them directly.
+    """
+
+    def __init__(self, *targets):
+        self.targets = [target for target in targets if target]
+        self.rows = []
+        self.lines = []
+
+    def add(self, loc, block, label, opcode, operand, line=None, source=None):
+        self.rows.append(ListingRow(loc, block, label, opcode, operand, line, source))
+        if self.targets:
+            self.lines.append(format_listing_line(loc, block, label, opcode, operand))
+
+    def write(self):
+        text = "".join(self.lines)
+        for target in self.targets:
+            with open_output(target) as f:
+                f.write(text)
+
+
+def parse_listing_line(line):
+    """Split a line written by format_listing_line back into a ListingRow"""
+    line = line.rstrip("\n")
+    if not line.strip():
+        return None
+    loc, block, rest = (line.split(" ", 2) + ["", ""])[:3]
+    if rest[:1] == " ":
+        label = ""
+        fields = rest.split(None, 1)
+    else:
+        fields = rest.split(None, 2)
+        label = fields.pop(0) if fields else ""
+    opcode = fields[0] if fields else ""
+    operand = fields[1].strip() if len(fields) > 1 else ""
+    return ListingRow(int(loc, 16) if loc.strip() else None, int(block), label, opcode, operand)
+
+
+def read_listing(source):
+    """Read an intermediate file into ListingRows, keeping every line in order"""
+    with open_input(source) as f:
+        return [row for row in map(parse_listing_line, f) if row is not None]
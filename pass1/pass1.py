@@ -1,5 +1,12 @@
+import os
 import re
+from collections import namedtuple
+from itertools import accumulate
 from .length_tracker import LengthTracker
+from .symbol_index import SymbolIndex, referenced_symbols
+from .listing import Listing
+from .source_cache import SOURCE_CACHE
+from utilities import open_input, open_output
 
 class Literal:
     def __init__(self, name, value, length):
@@ -13,6 +20,31 @@ class Literal:
     def __eq__(self, other):
         return self.name == other.name if isinstance(other, Literal) else False
 
+# What pass1 hands to later stages: the listing rows, the symbol index, any rewrites
+# and the INCBIN files as BinaryIncludes
+Pass1Result = namedtuple("Pass1Result", "statements symbols rewrites binaries", defaults=((), ()))
+
+# A binary file pulled in by INCBIN; loc is relative to its block like every listing location
+BinaryInclude = namedtuple("BinaryInclude", "loc block path")
+
+# SIC/XE addresses are 20 bits; locations are written as five hex digits
+MEMORY_SIZE = 0x100000
+
+def format3_displacement(target_address, location, base_address=None):
+    """(displacement, b, p) with which a format 3 statement at location reaches target_address, or None.
+
+    Both addresses are absolute. PC-relative is tried first, then
+    base-relative, then direct addressing, as pass2 encodes them.
+    """
+    disp = target_address - (location + 3)
+    if -2048 <= disp <= 2047:
+        return disp, 0, 1
+    if base_address is not None and 0 <= target_address - base_address <= 4095:
+        return target_address - base_address, 1, 0
+    if 0 <= target_address <= 0xFFF:
+        return target_address, 0, 0
+    return None
+
 VALID_BLOCKS = {
     "DEFAULT": 0,
     "DEFAULTB": 1,
@@ -36,6 +68,110 @@ def parse_line(line):
     
     return [p.strip() for p in parts if p.strip()]
 
+# One tokenized source statement; has_label is true when the line does not start with a space.
+# source names the COPY/INCLUDE file the statement came from, None for the main file
+SourceLine = namedtuple("SourceLine", "line_number has_label parts source", defaults=(None,))
+
+def describe_line(source_line):
+    """Line number of a statement for messages and listings, naming its file when included"""
+    if source_line.source is None:
+        return source_line.line_number
+    return f"{source_line.line_number} of {source_line.source}"
+
+# Directives that splice another source file in place; the operand is its path
+INCLUDE_DIRECTIVES = {"COPY", "INCLUDE"}
+
+# Places a binary file's bytes at the current location; the operand is its path
+BINARY_DIRECTIVE = "INCBIN"
+
+def tokenize_source(lines, first_line=1):
+    """Tokenize source lines into SourceLines, skipping blank and comment lines.
+
+    Lines are numbered from first_line.
+
+    Unlabelled COPY/INCLUDE lines and INCBIN lines keep their path as
+    written instead of going through parse_line, which would cut it at its
+    first '.'.
+    """
+    source_lines = []
+    for line_number, line in enumerate(lines, first_line):
+        original_line = line.strip()
+        if not original_line or original_line.startswith('.'):
+            continue
+
+        # Only in the instruction column: COPY is also a common program name
+        words = original_line.split()
+        if line[0].isspace() and words[0] in INCLUDE_DIRECTIVES:
+            source_lines.append(SourceLine(line_number, False, words[:2]))
+            continue
+        has_label = not line[0].isspace()
+        if len(words) > has_label and words[has_label] == BINARY_DIRECTIVE:
+            source_lines.append(SourceLine(line_number, has_label, words[:has_label + 2]))
+            continue
+
+        parts = parse_line(original_line)
+        if not parts:
+            continue
+
+        source_lines.append(SourceLine(line_number, not line.startswith(' '), parts))
+    return source_lines
+
+def expand_includes(source_lines, directory, including=()):
+    """Replace COPY/INCLUDE statements with the statements of the named file.
+
+    Spliced statements keep their own line numbers and carry the path as
+    written in the COPY statement as their source. Paths are relative to
+    directory, the folder of the including file; INCBIN files must exist
+    and their paths are made absolute so later stages can open them from
+    any working directory. Included files come from SOURCE_CACHE, so a
+    library shared by many programs is read and tokenized once per process.
+    """
+    expanded = []
+    for source_line in source_lines:
+        parts = source_line.parts
+        if BINARY_DIRECTIVE in parts[:2]:
+            if parts[-1] == BINARY_DIRECTIVE:
+                raise AssemblerError(f"Error at line {describe_line(source_line)}: INCBIN needs a file name")
+            path = os.path.join(directory, parts[-1])
+            if not os.path.isfile(path):
+                raise AssemblerError(
+                    f"Error at line {describe_line(source_line)}: Cannot read binary file '{parts[-1]}'"
+                )
+            expanded.append(source_line._replace(parts=parts[:-1] + [os.path.abspath(path)]))
+            continue
+        if source_line.has_label or parts[0] not in INCLUDE_DIRECTIVES:
+            expanded.append(source_line)
+            continue
+
+        where = describe_line(source_line)
+        if len(parts) < 2:
+            raise AssemblerError(f"Error at line {where}: {parts[0]} needs a file name")
+        path = os.path.realpath(os.path.join(directory, parts[1]))
+        if path in including:
+            raise AssemblerError(f"Error at line {where}: {parts[1]} includes itself")
+        try:
+            statements = SOURCE_CACHE.get(path, lambda text: tokenize_source(text.splitlines()))
+        except OSError as e:
+            raise AssemblerError(f"Error at line {where}: Cannot read {parts[1]}: {e}")
+        for statement in statements:
+            if "START" in statement.parts[:2] or "END" in statement.parts[:2]:
+                raise AssemblerError(f"Error at line {where}: {parts[1]} must not contain START or END")
+        statements = [statement._replace(source=parts[1]) for statement in statements]
+        expanded.extend(expand_includes(statements, os.path.dirname(path), including + (path,)))
+    return expanded
+
+def read_source(input_file, directory=None):
+    """Tokenize a source file into SourceLines, splicing in COPY/INCLUDE files.
+
+    Included paths are relative to directory, by default the folder of
+    input_file or, for a stream, the working directory.
+    """
+    with open_input(input_file) as infile:
+        source_lines = tokenize_source(infile)
+    if directory is None:
+        directory = os.path.dirname(os.path.abspath(input_file)) if isinstance(input_file, str) else os.getcwd()
+    return expand_includes(source_lines, directory)
+
 def parse_literal(literal_str):
     if literal_str.startswith('=X'):
         return (len(literal_str) - 4) // 2
@@ -75,6 +211,11 @@ def calculate_instruction_size(instruction, operand=None):
                            "STI", "STL", "STS", "STSW", "STT", "STX", "SUB", "SUBF", 
                            "TD", "TIX", "WD"]:
             return 3
+        elif instruction == "INCBIN":
+            try:
+                return os.path.getsize(operand)  # From the file's metadata; the bytes are read by HTME
+            except (OSError, TypeError):
+                raise AssemblerError(f"Cannot read binary file '{operand}'")
         elif instruction in ["START", "END", "USE", "EQU", "LTORG","BASE"]:
             return 0
         else:
@@ -82,17 +223,7 @@ def calculate_instruction_size(instruction, operand=None):
     except ValueError as e:
         raise ValueError(f"Error calculating size for {instruction}: {e}")
 
-def write_formatted_line(file, loc, block, label, opcode, operand):
-    loc_str = f"{loc:04X}" if loc is not None else "    "
-    block_str = f"{block}"
-    label_str = f"{label:<8}" if label else " " * 8
-    opcode_str = f"{opcode:<8}" if opcode else " " * 8
-    operand_str = f"{operand:<12}" if operand else " " * 12
-    
-    formatted_line = f"{loc_str} {block_str} {label_str} {opcode_str} {operand_str}"
-    file.write(formatted_line.rstrip() + "\n")
-
-def handle_literal_pool(literals, current_address, current_block, inter_file, lc_file, length_tracker):
+def handle_literal_pool(literals, current_address, current_block, listing, length_tracker):
     # Get only unprocessed literals that appeared before the current address
     unprocessed_literals = [lit for lit in literals 
                           if not lit.used and 
@@ -102,8 +233,7 @@ def handle_literal_pool(literals, current_address, current_block, inter_file, lc
         return current_address
 
     # Write literal pool header only if there are literals to process
-    write_formatted_line(inter_file, current_address, VALID_BLOCKS[current_block], "", "*", "LITERAL POOL")
-    write_formatted_line(lc_file, current_address, VALID_BLOCKS[current_block], "", "*", "LITERAL POOL")
+    listing.add(current_address, VALID_BLOCKS[current_block], "", "*", "LITERAL POOL")
 
     # Process each unique literal only once
     processed_names = set()
@@ -114,8 +244,7 @@ def handle_literal_pool(literals, current_address, current_block, inter_file, lc
             literal.used = True
             processed_names.add(literal.name)
             
-            write_formatted_line(inter_file, current_address, VALID_BLOCKS[current_block], "", "*", literal.name)
-            write_formatted_line(lc_file, current_address, VALID_BLOCKS[current_block], "", "*", literal.name)
+            listing.add(current_address, VALID_BLOCKS[current_block], "", "*", literal.name)
             current_address += literal.length
             # Update length tracker for the current block
             length_tracker.update_from_location(current_address, current_block)
@@ -194,9 +323,78 @@ def validate_symbol_reference(operand, symbol_table, line_number, instruction=No
             f"Error at line {line_number}: Undefined symbol '{operand}'"
         )
 
-def pass1(input_file, intermediate_file, symb_table_file, lc_file):
+def compute_locations(source_lines):
+    """Assign every statement's location with per-block prefix sums.
+
+    Statement sizes and the block each one is assembled into are collected
+    first; each block's locations are then one cumulative sum over its
+    sizes. Literal pools only add their size at the LTORG/END that emits
+    them, and EQU * simply picks up the location of its slot. Returns
+    (locations aligned with source_lines, {block: length}).
+    """
+    sizes = [0] * len(source_lines)
+    blocks = ["DEFAULT"] * len(source_lines)
+    current_block = "DEFAULT"
+    seen_literals = set()
+    pending_literals = {}
+
+    for index, source_line in enumerate(source_lines[1:], 1):  # skip START
+        components = source_line.parts
+        blocks[index] = current_block
+
+        if (len(components) > 1 and components[1] == "END") or components[0] == "END":
+            sizes[index] = sum(pending_literals.values())
+            break
+
+        if components[0] == "USE":
+            new_block = components[1] if len(components) > 1 else "DEFAULT"
+            validate_block_name(new_block, describe_line(source_line))
+            current_block = new_block
+            continue
+
+        instruction = components[1] if source_line.has_label else components[0]
+        operand = components[-1] if len(components) > 1 else None
+
+        if operand and operand.startswith('=') and operand not in seen_literals:
+            seen_literals.add(operand)
+            pending_literals[operand] = parse_literal(operand)
+
+        if instruction == "LTORG":
+            sizes[index] = sum(pending_literals.values())
+            pending_literals = {}
+        else:
+            sizes[index] = calculate_instruction_size(instruction, operand)
+
+    locations = [0] * len(source_lines)
+    block_lengths = {}
+    for block in VALID_BLOCKS:
+        indexes = [index for index, name in enumerate(blocks) if name == block]
+        starts = accumulate((sizes[index] for index in indexes), initial=0)
+        for index, location in zip(indexes, starts):
+            locations[index] = location
+        # One reduction per block instead of a max() per statement
+        block_lengths[block] = sum(sizes[index] for index in indexes)
+
+    return locations, block_lengths
+
+def pass1(input_file, intermediate_file, symb_table_file, lc_file, xref_file=None, prefix_sums=False,
+          peephole=False, disabled_rules=(), constant_pooling=False, directory=None):
+    """Assign locations and symbols, write the pass 1 outputs and return a Pass1Result.
+
+    input_file         source path or stream, or a list of SourceLines
+    intermediate_file  receives the listing pass2 reads; lc_file gets the same listing
+    symb_table_file    receives the block, symbol and literal tables
+    xref_file          receives the cross-reference listing when given
+    prefix_sums        assign locations with per-block prefix sums (compute_locations)
+    peephole           run the peephole rules of peephole.py, except those in disabled_rules
+    constant_pooling   pool literals and read-only constants by value (constant_pool.py)
+    directory          folder COPY/INCLUDE and INCBIN paths are relative to, see read_source
+    """
     symbol_table = {}
+    definition_lines = {}
+    references = []  # (symbol, line number) for the cross-reference listing
     literal_table = []
+    binaries = []
     length_tracker = LengthTracker()
     forward_references = []  # Store symbols to validate later
     
@@ -215,41 +413,49 @@ def pass1(input_file, intermediate_file, symb_table_file, lc_file):
     REGISTERS = {'A', 'X', 'L', 'B', 'S', 'T', 'F', 'PC', 'SW'}
     REGISTER_INSTRUCTIONS = {"CLEAR", "COMPR", "ADDR", "SUBR", "MULR", "DIVR", "TIXR", "RMO"}
 
-    # First pass to collect all labels
-    with open(input_file, 'r') as infile:
-        line_number = 0
-        for line in infile:
-            line_number += 1
-            original_line = line.strip()
-            if not original_line or original_line.startswith('.'):
-                continue
-
-            parts = parse_line(original_line)
-            if not parts:
-                continue
+    if isinstance(input_file, list):
+        source_lines = expand_includes(input_file, directory or os.getcwd())
+    else:
+        source_lines = read_source(input_file, directory)
+
+    rewrites = []
+    if constant_pooling:
+        from .constant_pool import pool_constants
+        source_lines, rewrites, saved = pool_constants(source_lines)
+        print(f"Constant pooling saved {saved} bytes")
+    if peephole:
+        from .peephole import optimize
+        source_lines, peephole_rewrites = optimize(source_lines, disabled=disabled_rules)
+        rewrites = rewrites + peephole_rewrites
 
-            # Add label to symbol table
-            if not line.startswith(' '):  # Has label
-                label = parts[0]
-                if len(parts) > 1:
-                    instruction = parts[1]
-                    if instruction != "START":  # Don't add START labels to validation
-                        symbol_table[label] = None  # Temporary value, will be updated later
+    # First pass to collect all labels
+    for source_line in source_lines:
+        parts = source_line.parts
+        line_number = describe_line(source_line)
 
-            # Store operand references for later validation
+        # Add label to symbol table
+        if source_line.has_label:
+            label = parts[0]
             if len(parts) > 1:
-                operand = parts[-1] if len(parts) > 2 else None
-                instruction = parts[1] if not line.startswith(' ') else parts[0]
-                
-                if operand and not operand.startswith(('=', '#', '@')) and not operand.isdigit():
-                    # Skip validation for special cases
-                    if not (('EQU' in parts) or  # Skip all EQU operands
-                           (instruction == "BYTE" and operand.startswith(("X'", "C'")) and operand.endswith("'")) or  # Skip BYTE literals
-                           'WORD' in parts or  # Skip WORD operands
-                           operand.strip() in REGISTERS or  # Skip single register references
-                           (instruction in REGISTER_INSTRUCTIONS and  # Skip register instruction operands
-                            any(reg.strip() in REGISTERS for reg in operand.split(',')))):
-                        forward_references.append((operand, line_number))
+                instruction = parts[1]
+                if instruction != "START":  # Don't add START labels to validation
+                    symbol_table[label] = None  # Temporary value, will be updated later
+
+        # Store operand references for later validation
+        if len(parts) > 1:
+            operand = parts[-1] if len(parts) > 2 else None
+            instruction = parts[1] if source_line.has_label else parts[0]
+
+            if operand and not operand.startswith(('=', '#', '@')) and not operand.isdigit():
+                # Skip validation for special cases
+                if not (('EQU' in parts) or  # Skip all EQU operands
+                       instruction == BINARY_DIRECTIVE or  # Skip file names
+                       (instruction == "BYTE" and operand.startswith(("X'", "C'")) and operand.endswith("'")) or  # Skip BYTE literals
+                       'WORD' in parts or  # Skip WORD operands
+                       operand.strip() in REGISTERS or  # Skip single register references
+                       (instruction in REGISTER_INSTRUCTIONS and  # Skip register instruction operands
+                        any(reg.strip() in REGISTERS for reg in operand.split(',')))):
+                    forward_references.append((operand, line_number))
 
     # Validate all forward references
     for symbol, line_num in forward_references:
@@ -258,125 +464,135 @@ def pass1(input_file, intermediate_file, symb_table_file, lc_file):
                 f"Error at line {line_num}: Undefined symbol '{symbol}'"
             )
 
-    # Reset file and continue with normal processing
-    with open(input_file, 'r') as infile, open(intermediate_file, 'w') as inter, open(lc_file, 'w') as lc_out:
-        end_encountered = False
-        line_number = 0
-        
-        try:
-            for line in infile:
-                line_number += 1
-                original_line = line.strip()
-                if not original_line or original_line.startswith('.'):
-                    continue
+    # Assign locations and write the listing
+    # intermediate.txt and out_pass1.txt carry the same listing
+    listing = Listing(intermediate_file, lc_file)
+
+    end_encountered = False
+    line_number = 0
+
+    try:
+        # Either precompute every location, or advance the counters statement by statement
+        locations = None
+        if prefix_sums:
+            locations, block_lengths = compute_locations(source_lines)
+
+        for index, source_line in enumerate(source_lines):
+            line_number = describe_line(source_line)
+            components = source_line.parts
+            
+            # Skip processing for START directive
+            if first_line:
+                first_line = False
+                listing.add(0, VALID_BLOCKS[current_block], components[0], components[1], components[2],
+                            source_line.line_number, source_line.source)
+                continue
+
+            lc = locations[index] if locations is not None else block_counters[current_block]
+
+            # Handle END directive
+            if (len(components) > 1 and components[1] == "END") or components[0] == "END":
+                if not end_encountered:
+                    end_encountered = True
+                    # Process any remaining literals
+                    if literal_table:
+                        lc = handle_literal_pool(literal_table, lc, current_block, listing, length_tracker)
+                        block_counters[current_block] = lc
+                        # Ensure the block length is updated after processing the last literal
+                        length_tracker.update_from_location(lc, current_block)
+                    listing.add(lc, VALID_BLOCKS[current_block], "", "END", components[-1],
+                                source_line.line_number, source_line.source)
+                continue
+
+            # Skip if we've already processed an END directive
+            if end_encountered:
+                continue
+
+            # Handle USE directive with block validation
+            if components[0] == "USE":
+                new_block = components[1] if len(components) > 1 else "DEFAULT"
+                validate_block_name(new_block, line_number)
+                current_block = new_block
+                listing.add(lc, VALID_BLOCKS[current_block], "", "USE", current_block,
+                            source_line.line_number, source_line.source)
+                continue
 
-                parts = parse_line(original_line)
-                if not parts:
-                    continue
+            # Handle instructions with symbol validation
+            has_label = source_line.has_label
+            instruction = components[1] if has_label else components[0]
+            operand = components[-1] if len(components) > 1 else None
 
-                components = parts
+            # Validate symbol references in operands
+            if operand and not instruction == "EQU":
+                # Split operand to handle indexed addressing
+                operand_parts = operand.split(',')
+                base_operand = operand_parts[0]
                 
-                # Skip processing for START directive
-                if first_line:
-                    first_line = False
-                    write_formatted_line(inter, 0, VALID_BLOCKS[current_block], components[0], components[1], components[2])
-                    write_formatted_line(lc_out, 0, VALID_BLOCKS[current_block], components[0], components[1], components[2])
-                    continue
-
-                lc = block_counters[current_block]
-
-                # Handle END directive
-                if (len(components) > 1 and components[1] == "END") or components[0] == "END":
-                    if not end_encountered:
-                        end_encountered = True
-                        # Process any remaining literals
-                        if literal_table:
-                            lc = handle_literal_pool(literal_table, lc, current_block, inter, lc_out, length_tracker)
-                            block_counters[current_block] = lc
-                            # Ensure the block length is updated after processing the last literal
-                            length_tracker.update_from_location(lc, current_block)
-                        write_formatted_line(inter, lc, VALID_BLOCKS[current_block], "", "END", components[-1])
-                        write_formatted_line(lc_out, lc, VALID_BLOCKS[current_block], "", "END", components[-1])
-                    continue
-
-                # Skip if we've already processed an END directive
-                if end_encountered:
-                    continue
-
-                # Handle USE directive with block validation
-                if components[0] == "USE":
-                    new_block = components[1] if len(components) > 1 else "DEFAULT"
-                    validate_block_name(new_block, line_number)
-                    current_block = new_block
-                    write_formatted_line(inter, lc, VALID_BLOCKS[current_block], "", "USE", current_block)
-                    write_formatted_line(lc_out, lc, VALID_BLOCKS[current_block], "", "USE", current_block)
-                    continue
-
-                # Handle instructions with symbol validation
-                has_label = not line.startswith(' ')
-                instruction = components[1] if has_label else components[0]
-                operand = components[-1] if len(components) > 1 else None
-
-                # Validate symbol references in operands
-                if operand and not instruction == "EQU":
-                    # Split operand to handle indexed addressing
-                    operand_parts = operand.split(',')
-                    base_operand = operand_parts[0]
-                    
-                    # Skip validation for literals, immediate values, and indirect addressing
-                    if not (base_operand.startswith(('=', '#', '@')) or 
-                           base_operand.isdigit() or 
-                           instruction in ["START", "END", "USE", "LTORG"]):
-                        validate_symbol_reference(base_operand, symbol_table, line_number, instruction, REGISTERS)
-
-                # Write the line to output files
-                if has_label:
-                    label = components[0]
-                    if instruction == "EQU":
-                        if "BUFEND-BUFFER" in original_line:
-                            symbol_table[label] = (0x1000, "A")  # Fixed size for BUFEND-BUFFER
-                        elif "*" in original_line:
-                            symbol_table[label] = (lc, "R")
-                    elif instruction != "START":
+                # Skip validation for literals, immediate values, and indirect addressing
+                if not (base_operand.startswith(('=', '#', '@')) or 
+                       base_operand.isdigit() or 
+                       instruction in ["START", "END", "USE", "LTORG", BINARY_DIRECTIVE]):
+                    validate_symbol_reference(base_operand, symbol_table, line_number, instruction, REGISTERS)
+
+            # Record references for the cross-reference listing
+            if operand and instruction != BINARY_DIRECTIVE:
+                for name in referenced_symbols(operand):
+                    if name in symbol_table:
+                        references.append((name, line_number))
+
+            # Write the line to output files
+            if has_label:
+                label = components[0]
+                definition_lines[label] = line_number
+                if instruction == "EQU":
+                    if "BUFEND-BUFFER" in operand:
+                        symbol_table[label] = (0x1000, "A")  # Fixed size for BUFEND-BUFFER
+                    elif "*" in operand:
                         symbol_table[label] = (lc, "R", current_block)
+                    elif symbol_table.get(operand):
+                        symbol_table[label] = symbol_table[operand]  # Alias of an earlier symbol
+                elif instruction != "START":
+                    symbol_table[label] = (lc, "R", current_block)
+
+            listing.add(lc, VALID_BLOCKS[current_block],
+                        components[0] if has_label else "",
+                        instruction,
+                        operand if operand else "",
+                        source_line.line_number, source_line.source)
+
+            if instruction == BINARY_DIRECTIVE:
+                binaries.append(BinaryInclude(lc, VALID_BLOCKS[current_block], operand))
+
+            # Handle literals
+            if operand and operand.startswith('='):
+                literal_length = parse_literal(operand)
+                new_literal = Literal(operand, operand, literal_length)
+                if new_literal not in literal_table:
+                    literal_table.append(new_literal)
+
+            # Handle LTORG directive
+            if instruction == "LTORG":
+                lc = handle_literal_pool(literal_table, lc, current_block, listing, length_tracker)
+                block_counters[current_block] = lc
+                continue
 
-                write_formatted_line(inter, lc, VALID_BLOCKS[current_block], 
-                                  components[0] if has_label else "", 
-                                  instruction, 
-                                  operand if operand else "")
-                write_formatted_line(lc_out, lc, VALID_BLOCKS[current_block], 
-                                   components[0] if has_label else "", 
-                                   instruction, 
-                                   operand if operand else "")
-
-                # Handle literals
-                if operand and operand.startswith('='):
-                    literal_length = parse_literal(operand)
-                    new_literal = Literal(operand, operand, literal_length)
-                    if new_literal not in literal_table:
-                        literal_table.append(new_literal)
-
-                # Handle LTORG directive
-                if instruction == "LTORG":
-                    lc = handle_literal_pool(literal_table, lc, current_block, inter, lc_out, length_tracker)
-                    block_counters[current_block] = lc
-                    continue
-
-                # Update location counter
-                if not (instruction == "USE" or instruction == "LTORG" or instruction == "END"):
-                    instruction_size = calculate_instruction_size(instruction, operand)
-                    block_counters[current_block] += instruction_size
-                    length_tracker.update_from_location(block_counters[current_block], current_block)
-
-        except (UnidentifiedBlockError, UnidentifiedSymbolError) as e:
-            print(f"\nAssembly Error:\n{str(e)}")
-            raise
-        except Exception as e:
-            print(f"\nUnexpected error at line {line_number}:\n{str(e)}")
-            raise
+            # Update location counter
+            if locations is None and not (instruction == "USE" or instruction == "LTORG" or instruction == "END"):
+                instruction_size = calculate_instruction_size(instruction, operand)
+                block_counters[current_block] += instruction_size
+                length_tracker.update_from_location(block_counters[current_block], current_block)
+
+    except AssemblerError as e:
+        print(f"\nAssembly Error:\n{str(e)}")
+        raise
+    except Exception as e:
+        print(f"\nUnexpected error at line {line_number}:\n{str(e)}")
+        raise
+    finally:
+        listing.write()
 
     # Update block_info with tracked lengths
-    lengths = length_tracker.get_all_lengths()
+    lengths = block_lengths if prefix_sums else length_tracker.get_all_lengths()
     for block in block_info:
         block_info[block]["length"] = lengths[block]
 
@@ -385,6 +601,10 @@ def pass1(input_file, intermediate_file, symb_table_file, lc_file):
     block_info["CDATA"]["start"] = block_info["DEFAULTB"]["start"] + block_info["DEFAULTB"]["length"]
     block_info["CBLKS"]["start"] = block_info["CDATA"]["start"] + block_info["CDATA"]["length"]
 
+    program_end = block_info["CBLKS"]["start"] + block_info["CBLKS"]["length"]
+    if program_end > MEMORY_SIZE:
+        raise AssemblerError(f"Program needs {program_end:X} bytes, more than the {MEMORY_SIZE:X} addressable")
+
     # Update symbol values with block start addresses
     final_symbol_table = {}
     for symbol, info in symbol_table.items():
@@ -399,18 +619,21 @@ def pass1(input_file, intermediate_file, symb_table_file, lc_file):
 
     symbol_table = final_symbol_table
 
+    symbol_index = SymbolIndex()
+    for symbol, (value, sym_type) in symbol_table.items():
+        symbol_index.define(symbol, value, sym_type, definition_lines.get(symbol))
+    for symbol, line_num in references:
+        symbol_index.add_reference(symbol, line_num)
+
     # Write symbol table with correct sorting
-    with open(symb_table_file, 'w') as symb:
+    with open_output(symb_table_file) as symb:
         # Write block information
         symb.write("Block name\tBlock number\tAddress\tLength\n")
         for block_name, info in block_info.items():
-            symb.write(f"{block_name}\t{info['number']}\t{info['start']:04X}\t{info['length']:04X}\n")
+            symb.write(f"{block_name}\t{info['number']}\t{info['start']:05X}\t{info['length']:05X}\n")
 
     
-        symb.write("\nSymbol\tValue\n")
-        sorted_symbols = sorted(symbol_table.items(), key=lambda x: x[1][0])
-        for symbol, (value, _) in sorted_symbols:
-            symb.write(f"{symbol}\t{value:04X}\n")
+        symbol_index.write_symbols(symb)
 
    
         symb.write("\nLiteral\tLength\tAddress\tValue\n")
@@ -419,4 +642,10 @@ def pass1(input_file, intermediate_file, symb_table_file, lc_file):
                 # Calculate absolute address by adding block start address
                 abs_address = literal.address + block_info[literal.block]["start"]
                 value = parse_literal_value(literal.name)
-                symb.write(f"{literal.name}\t{literal.length}\t{abs_address:04X}\t{value}\n")
\ No newline at end of file
+                symb.write(f"{literal.name}\t{literal.length}\t{abs_address:05X}\t{value}\n")
+
+    if xref_file:
+        with open_output(xref_file) as xref:
+            symbol_index.write_cross_reference(xref)
+
+    return Pass1Result(listing.rows, symbol_index, rewrites, binaries)
@@ -0,0 +1,233 @@
+from collections import namedtuple
+from itertools import accumulate
+from .instructionSet import Mnemonic as OPCODE_TABLE
+from .pass1 import VALID_BLOCKS, compute_locations, describe_line, format3_displacement, parse_literal
+
+# One change made by a rule; line_number is the source line it applies to, as describe_line gives it
+Rewrite = namedtuple("Rewrite", "rule line_number description")
+
+LOAD_FOR_STORE = {
+    "STA": "LDA", "STB": "LDB", "STCH": "LDCH", "STF": "LDF", "STL": "LDL",
+    "STS": "LDS", "STT": "LDT", "STX": "LDX",
+}
+
+# Loads that replace the whole register, making a preceding CLEAR redundant
+LOAD_FOR_REGISTER = {
+    "A": "LDA", "X": "LDX", "L": "LDL", "B": "LDB", "S": "LDS", "T": "LDT",
+}
+
+JUMPS = {"J", "JEQ", "JGT", "JLT", "JSUB"}
+
+
+def split_statement(statement):
+    """Return (label, instruction, operand) of a SourceLine"""
+    parts = statement.parts
+    label = parts[0] if statement.has_label else ""
+    rest = parts[1:] if statement.has_label else parts
+    instruction = rest[0] if rest else ""
+    operand = rest[-1] if len(rest) > 1 else ""
+    return label, instruction, operand
+
+
+def make_statement(original, label, instruction, operand):
+    """A SourceLine that takes the place (line number and source file) of original"""
+    parts = [instruction] + ([operand] if operand else [])
+    if label:
+        parts = [label] + parts
+    return original._replace(has_label=bool(label), parts=parts)
+
+
+def layout(statements):
+    """Absolute address of every label and literal in statements.
+
+    Mirrors pass1: blocks are laid out in VALID_BLOCKS order, and each
+    literal is placed once, in the first LTORG or END after its first use.
+    """
+    locations, block_lengths = compute_locations(statements)
+    starts = dict(zip(VALID_BLOCKS, accumulate((block_lengths[name] for name in VALID_BLOCKS), initial=0)))
+
+    addresses = []
+    symbols = {}
+    literals = {}
+    pending = []
+    aliases = []
+    block = "DEFAULT"
+    for index, statement in enumerate(statements):
+        label, instruction, operand = split_statement(statement)
+        if instruction == "USE":
+            block = operand or "DEFAULT"
+        address = starts[block] + locations[index]
+        addresses.append(address)
+
+        if instruction in ("LTORG", "END"):
+            for name in pending:
+                literals[name] = address
+                address += parse_literal(name)
+            pending = []
+        elif operand.startswith('=') and operand not in literals and operand not in pending:
+            pending.append(operand)
+
+        if label and instruction == "EQU":
+            aliases.append((label, operand))
+        elif label and instruction != "START":
+            symbols[label] = addresses[index]
+        if instruction == "END":
+            break
+
+    for label, operand in aliases:
+        if operand in symbols:
+            symbols[label] = symbols[operand]
+    return addresses, symbols, literals
+
+
+def reaches(instruction, address, target):
+    """True when pass2 can encode instruction at address with target as its operand, without a base register"""
+    return instruction.startswith('+') or (target is not None and format3_displacement(target, address) is not None)
+
+
+def is_plain_operand(operand):
+    return operand and not operand.startswith(('#', '@', '='))
+
+
+def redundant_load(statements):
+    """Drop a load of the location and register that the previous statement just stored"""
+    result = []
+    rewrites = []
+    for statement in statements:
+        label, instruction, operand = split_statement(statement)
+        if result and not label and is_plain_operand(operand):
+            _, prev_instruction, prev_operand = split_statement(result[-1])
+            if LOAD_FOR_STORE.get(prev_instruction.lstrip('+')) == instruction.lstrip('+') and prev_operand == operand:
+                rewrites.append(Rewrite("redundant_load", describe_line(statement),
+                                        f"removed {instruction} {operand} after {prev_instruction} {prev_operand}"))
+                continue
+        result.append(statement)
+    return result, rewrites
+
+
+def jump_to_jump(statements):
+    """Retarget jumps whose destination is an unconditional J.
+
+    A format 3 jump follows the chain only as far as it can still reach,
+    so the rewrite never needs format 4 or fails in pass2.
+    """
+    addresses, symbols, _ = layout(statements)
+    jump_targets = {}
+    for statement in statements:
+        label, instruction, operand = split_statement(statement)
+        if label and instruction == "J" and is_plain_operand(operand) and ',' not in operand:
+            jump_targets[label] = operand
+
+    result = []
+    rewrites = []
+    for index, statement in enumerate(statements):
+        label, instruction, operand = split_statement(statement)
+        if instruction.lstrip('+') in JUMPS and operand in jump_targets:
+            target = operand
+            visited = {operand}
+            hop = operand
+            while hop in jump_targets and jump_targets[hop] not in visited:
+                hop = jump_targets[hop]
+                visited.add(hop)
+                if reaches(instruction, addresses[index], symbols.get(hop)):
+                    target = hop
+            if target != operand:
+                rewrites.append(Rewrite("jump_to_jump", describe_line(statement),
+                                        f"{instruction} {operand} -> {instruction} {target}"))
+                statement = make_statement(statement, label, instruction, target)
+        result.append(statement)
+    return result, rewrites
+
+
+def reads_register(register, instruction, operand):
+    """True when the load's address may depend on register.
+
+    X is read by indexed operands. B is read by base-relative addressing,
+    which pass2 may choose for any format 3 operand that is not an
+    immediate number.
+    """
+    if register == "X":
+        return ',X' in operand
+    if register == "B":
+        return not (instruction.startswith('+') or operand.lstrip('#').isdigit() and operand.startswith('#'))
+    return False
+
+
+def clear_before_load(statements):
+    """Drop CLEAR r when the next statement loads the whole of r without reading it"""
+    result = []
+    rewrites = []
+    index = 0
+    while index < len(statements):
+        statement = statements[index]
+        label, instruction, operand = split_statement(statement)
+        if instruction == "CLEAR" and index + 1 < len(statements):
+            next_label, next_instruction, next_operand = split_statement(statements[index + 1])
+            if (not next_label and next_operand
+                    and next_instruction.lstrip('+') == LOAD_FOR_REGISTER.get(operand)
+                    and not reads_register(operand, next_instruction, next_operand)):
+                rewrites.append(Rewrite("clear_before_load", describe_line(statement),
+                                        f"removed CLEAR {operand} before {next_instruction} {next_operand}"))
+                # The CLEAR's label moves to the load
+                result.append(make_statement(statements[index + 1], label,
+                                             next_instruction, next_operand))
+                index += 2
+                continue
+        result.append(statement)
+        index += 1
+    return result, rewrites
+
+
+def shorten_format4(statements):
+    """Turn +OP into OP when format 3 reaches the target without a base register.
+
+    Addresses are estimated before the rewrite. Removing bytes only brings
+    statements closer together and lowers addresses, so an encoding that
+    fits before shrinking still fits afterwards.
+    """
+    addresses, symbols, _ = layout(statements)
+
+    result = []
+    rewrites = []
+    for index, statement in enumerate(statements):
+        label, instruction, operand = split_statement(statement)
+        mnemonic = instruction[1:]
+        if (instruction.startswith('+') and isinstance(OPCODE_TABLE.get(mnemonic), str)
+                and mnemonic != "RSUB" and operand and not operand.startswith('=')):
+            name = operand.lstrip('#@').split(',')[0]
+            if reaches(mnemonic, addresses[index], symbols.get(name)):
+                rewrites.append(Rewrite("shorten_format4", describe_line(statement),
+                                        f"{instruction} {operand} -> {mnemonic} {operand}"))
+                statement = make_statement(statement, label, mnemonic, operand)
+        result.append(statement)
+    return result, rewrites
+
+
+# Applied in this order; pass disabled rule names to optimize() to skip them
+RULES = {
+    "redundant_load": redundant_load,
+    "jump_to_jump": jump_to_jump,
+    "clear_before_load": clear_before_load,
+    "shorten_format4": shorten_format4,
+}
+
+
+def optimize(statements, rules=None, disabled=()):
+    """Run the peephole rules over pass1's statement list.
+
+    Returns the rewritten list and the Rewrites applied.
+    """
+    rules = RULES if rules is None else rules
+    report = []
+    for name, rule in rules.items():
+        if name in disabled:
+            continue
+        statements, rewrites = rule(statements)
+        report.extend(rewrites)
+    return statements, report
+
+
+def write_report(report, file):
+    file.write("Rule\tLine\tRewrite\n")
+    for rewrite in report:
+        file.write(f"{rewrite.rule}\t{rewrite.line_number}\t{rewrite.description}\n")
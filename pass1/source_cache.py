@@ -0,0 +1,56 @@
+import hashlib
+import os
+import threading
+
+
+class SourceCache:
+    """Process-wide cache of tokenized source files for COPY/INCLUDE.
+
+    Files are looked up by path first; while their mtime and size are
+    unchanged the tokenized statements are returned without reading the
+    file. Otherwise the file is read and hashed, and it is only tokenized
+    again when the content hash is new, so touching a file or including the
+    same library under several paths costs one read and no parse.
+    """
+
+    def __init__(self):
+        self.paths = {}       # path -> (mtime_ns, size, digest)
+        self.statements = {}  # digest -> tuple of SourceLines
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, path, tokenize):
+        """Return the statements of path, calling tokenize(text) on a cache miss"""
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+        with self.lock:
+            known = self.paths.get(path)
+            if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+                self.hits += 1
+                return self.statements[known[2]]
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+
+        with self.lock:
+            self.paths[path] = (stat.st_mtime_ns, stat.st_size, digest)
+            if digest in self.statements:
+                self.hits += 1
+                return self.statements[digest]
+            self.misses += 1
+
+        statements = tuple(tokenize(data.decode()))
+        with self.lock:
+            self.statements[digest] = statements
+        return statements
+
+    def clear(self):
+        with self.lock:
+            self.paths.clear()
+            self.statements.clear()
+            self.hits = self.misses = 0
+
+
+SOURCE_CACHE = SourceCache()
@@ -0,0 +1,107 @@
+import re
+from bisect import bisect_right
+from utilities import open_input
+
+
+def referenced_symbols(operand):
+    """Split an operand into the names it could reference (literals excluded)"""
+    if not operand or operand.startswith('='):
+        return []
+    names = re.split(r"[,+\-*/]", operand.lstrip('#@'))
+    return [name.strip() for name in names if name.strip() and not name.strip().isdigit()]
+
+
+class SymbolIndex:
+    """Symbol table searchable by name and by address.
+
+    Names map to (address, type). An address-ordered copy of the table is
+    built lazily so address -> symbol lookups can use bisect. Definition and
+    reference line numbers are kept for the cross-reference listing.
+    """
+
+    def __init__(self):
+        self.symbols = {}
+        self.definitions = {}
+        self.references = {}
+        self._addresses = []
+        self._names = []
+        self._dirty = False
+
+    def define(self, name, address, sym_type="R", line_number=None):
+        self.symbols[name] = (address, sym_type)
+        if line_number is not None:
+            self.definitions[name] = line_number
+        self._dirty = True
+
+    def add_reference(self, name, line_number):
+        self.references.setdefault(name, []).append(line_number)
+
+    def __contains__(self, name):
+        return name in self.symbols
+
+    def __getitem__(self, name):
+        return self.symbols[name][0]
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _rebuild(self):
+        ordered = sorted(self.symbols.items(), key=lambda x: x[1][0])
+        self._names = [name for name, _ in ordered]
+        self._addresses = [info[0] for _, info in ordered]
+        self._dirty = False
+
+    def sorted_items(self):
+        """Return (name, address, type) tuples in address order"""
+        if self._dirty:
+            self._rebuild()
+        return [(name, address, self.symbols[name][1])
+                for name, address in zip(self._names, self._addresses)]
+
+    def nearest(self, address):
+        """Return (name, offset) of the closest symbol at or below address, or None"""
+        if self._dirty:
+            self._rebuild()
+        pos = bisect_right(self._addresses, address)
+        if pos == 0:
+            return None
+        return self._names[pos - 1], address - self._addresses[pos - 1]
+
+    def describe(self, address):
+        """Format an address as SYMBOL+offset for listings and error messages"""
+        found = self.nearest(address)
+        if found is None:
+            return f"{address:05X}"
+        name, offset = found
+        return name if offset == 0 else f"{name}+{offset:X}"
+
+    def write_symbols(self, file):
+        file.write("\nSymbol\tValue\n")
+        for name, address, _ in self.sorted_items():
+            file.write(f"{name}\t{address:05X}\n")
+
+    def write_cross_reference(self, file):
+        file.write("Symbol\tValue\tDefined\tReferences\n")
+        for name in sorted(self.symbols):
+            address = self.symbols[name][0]
+            defined = self.definitions.get(name, "")
+            refs = ", ".join(str(line) for line in self.references.get(name, []))
+            file.write(f"{name}\t{address:05X}\t{defined}\t{refs}\n")
+
+    @classmethod
+    def from_symbol_file(cls, symb_table_file):
+        """Load the Symbol section of a symbTable.txt (a path or stream) written by pass1"""
+        index = cls()
+        with open_input(symb_table_file) as f:
+            symbol_section = False
+            for line in f:
+                if line.startswith('Symbol\tValue'):
+                    symbol_section = True
+                    continue
+                if symbol_section:
+                    if not line.strip():
+                        break
+                    parts = line.strip().split('\t')
+                    if len(parts) >= 2:
+                        index.define(parts[0], int(parts[1], 16))
+        return index
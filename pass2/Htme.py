@@ -1,15 +1,22 @@
-def extract_block_info(symb_table_file):
-    """Extract block information from symbol table."""
-    print("\n=== Extracting Block Information ===")
+from pass1.pass1 import AssemblerError
+from utilities import open_input, open_output
+
+def _quiet(*args):
+    pass
+
+def extract_block_info(symb_table_file, verbose=False):
+    """Extract block information from symbol table; verbose=True prints each block found."""
+    log = print if verbose else _quiet
+    log("\n=== Extracting Block Information ===")
     block_info = []
     try:
-        with open(symb_table_file, 'r') as f:
+        with open_input(symb_table_file) as f:
             lines = f.readlines()
             in_block_section = False
             
             for line in lines:
                 if "Block name" in line:
-                    print("Found block section")
+                    log("Found block section")
                     in_block_section = True
                     continue
                 if in_block_section and line.strip() and "Symbol" not in line:
@@ -18,23 +25,47 @@ def extract_block_info(symb_table_file):
                         name = parts[0].replace("(Default)", "0")
                         block_info.append({
                             "Block": name,
+                            "Number": parts[1],
                             "Address": parts[2],
                             "Length": parts[3]
                         })
-                        print(f"Added block: {name}, Address: {parts[2]}, Length: {parts[3]}")
+                        log(f"Added block: {name}, Address: {parts[2]}, Length: {parts[3]}")
                 if "Symbol" in line:
-                    print("End of block section")
+                    log("End of block section")
                     break
     except Exception as e:
         print(f"Error reading symbol table: {e}")
         return []
     
-    print(f"Extracted {len(block_info)} blocks")
+    log(f"Extracted {len(block_info)} blocks")
     return block_info
 
-def generate_htme_records(pass2_content, htme_output_file, block_info, program_name="FIRST"):
-    """Generate HTME records from Pass2 output."""
-    print("\n=== Starting HTME Record Generation ===")
+def load_binaries(binaries):
+    """Map (loc, block) of every INCBIN statement to a memoryview of its file"""
+    data = {}
+    for loc, block, path in binaries:
+        with open(path, 'rb') as f:
+            data[(loc, block)] = memoryview(f.read())
+    return data
+
+def generate_htme_records(pass2_content, htme_output_file, block_info, program_name="FIRST", binaries=(),
+                          verbose=False):
+    """Generate HTME records from Pass2 output.
+
+    binaries are pass1's BinaryIncludes. Their bytes never appear in the
+    pass 2 listing; each file is read once and its text records are cut
+    straight from a memoryview of it. An INCBIN missing from binaries is
+    read from the path in its listing line.
+
+    Listing locations are relative to their block; text and modification
+    records are relocated by the block starts in block_info, and the
+    program length is where the last block ends. verbose=True traces every
+    line and record on stdout; errors are always printed.
+    """
+    log = print if verbose else _quiet
+    log("\n=== Starting HTME Record Generation ===")
+    binary_data = load_binaries(binaries)
+    block_starts = {int(info["Number"]): int(info["Address"], 16) for info in block_info}
     start_address = 0
     text_records = []
     modification_records = []  # For storing M records
@@ -44,28 +75,32 @@ def generate_htme_records(pass2_content, htme_output_file, block_info, program_n
     current_block = None
 
     for line in pass2_content:
-        print(f"\nProcessing line: {line.strip()}")
+        log(f"\nProcessing line: {line.strip()}")
         
         # Skip header or empty lines
         if not line.strip() or line.startswith("Loc"):
-            print("Skipping header or empty line")
+            log("Skipping header or empty line")
             continue
 
         try:
-            # Parse fixed-width columns
+            # Parse the columns written by format_output_line; an operand wider
+            # than its 15 characters pushes the object code to the right
             loc = line[0:8].strip()
-            block = line[8:13].strip()
-            symbols = line[13:25].strip()
-            instr = line[25:35].strip()
-            reference = line[35:50].strip()
-            obj_code = line[50:].strip()
+            block = line[8:16].strip()
+            symbols = line[16:28].strip()
+            instr = line[28:42].strip()
+            if line[42:57].strip():
+                reference, _, obj_code = line[42:].strip().partition(' ')
+            else:
+                reference, obj_code = "", line[57:]
+            obj_code = obj_code.strip()
 
             if not loc.isalnum():
-                print("Skipping invalid line")
+                log("Skipping invalid line")
                 continue
 
-            loc = int(loc, 16)
-            print(f"Location: {loc:X}, Block: {block}, Instruction: {instr}, Reference: {reference}, Object Code: {obj_code}")
+            loc = int(loc, 16) + block_starts.get(int(block), 0)
+            log(f"Location: {loc:X}, Block: {block}, Instruction: {instr}, Reference: {reference}, Object Code: {obj_code}")
 
             # Check for Format 4 instructions (starting with +)
             if instr.startswith('+') and obj_code:
@@ -73,14 +108,14 @@ def generate_htme_records(pass2_content, htme_output_file, block_info, program_n
                 mod_location = loc + 1  # Skip the first byte (opcode)
                 mod_length = "05"  # Format 4 is 5 half-bytes
                 modification_records.append((mod_location, mod_length))
-                print(f"Added modification record for Format 4 instruction: loc={mod_location:06X}, len={mod_length}")
+                log(f"Added modification record for Format 4 instruction: loc={mod_location:06X}, len={mod_length}")
 
             # Start new text record if we switch blocks or encounter USE
             if current_text_record and (
                 instr == "USE" or  # Start new record on USE directive
                 (current_block is not None and block != current_block)  # or when block changes
             ):
-                print(f"Creating new text record due to block change or USE directive")
+                log(f"Creating new text record due to block change or USE directive")
                 text_records.append((current_start, current_length, "".join(current_text_record)))
                 current_text_record = []
                 current_length = 0
@@ -88,9 +123,32 @@ def generate_htme_records(pass2_content, htme_output_file, block_info, program_n
 
             current_block = block
 
+            # Reserved space ends the text record, so the next code is not loaded over the gap;
+            # binary data gets records of its own
+            if instr in ["RESW", "RESB", "INCBIN"] and current_text_record:
+                log(f"Creating new text record before {instr} at {loc:X}")
+                text_records.append((current_start, current_length, "".join(current_text_record)))
+                current_text_record = []
+                current_length = 0
+                current_start = None
+
+            key = (loc - block_starts.get(int(block), 0), int(block))
+            if instr == "INCBIN":
+                if key not in binary_data:
+                    try:
+                        binary_data.update(load_binaries([key + (reference,)]))
+                    except OSError:
+                        raise AssemblerError(f"Cannot read binary file '{reference}'") from None
+                data = binary_data[key]
+                for offset in range(0, len(data), 30):
+                    chunk = data[offset:offset + 30]
+                    text_records.append((loc + offset, len(chunk), chunk))
+                log(f"Added {len(data)} bytes of binary data at {loc:X}")
+                continue
+
             # Skip lines without object code or with directives
             if not obj_code or instr in ["USE", "EQU", "LTORG"]:
-                print(f"Skipping directive or empty object code: {instr}")
+                log(f"Skipping directive or empty object code: {instr}")
                 continue
 
             # Clean object code - remove any spaces
@@ -98,14 +156,14 @@ def generate_htme_records(pass2_content, htme_output_file, block_info, program_n
             
             # Skip if the object code column is empty or contains a symbol
             if not all(c in '0123456789ABCDEF' for c in obj_code):
-                print(f"Skipping invalid object code: {obj_code}")
+                log(f"Skipping invalid object code: {obj_code}")
                 continue
 
             # Convert BYTE constants
             if instr == "BYTE" and obj_code.startswith("C'"):
                 char = obj_code[2:-1]
                 obj_code = "".join(f"{ord(c):02X}" for c in char)
-                print(f"Converted BYTE constant to: {obj_code}")
+                log(f"Converted BYTE constant to: {obj_code}")
 
             # Start new text record if needed
             if (instr in ["RESW", "RESB"] or 
@@ -113,14 +171,14 @@ def generate_htme_records(pass2_content, htme_output_file, block_info, program_n
                 not current_text_record):
                 
                 if current_text_record:
-                    print(f"Creating new text record - Start: {current_start:X}, Length: {current_length}")
+                    log(f"Creating new text record - Start: {current_start:X}, Length: {current_length}")
                     text_records.append((current_start, current_length, "".join(current_text_record)))
                     current_text_record = []
                     current_length = 0
                 
                 if not instr in ["RESW", "RESB"]:
                     current_start = loc
-                    print(f"Setting new text record start address: {loc:X}")
+                    log(f"Setting new text record start address: {loc:X}")
 
             # Add only actual object code if not RESW/RESB
             if not instr in ["RESW", "RESB"]:
@@ -128,9 +186,9 @@ def generate_htme_records(pass2_content, htme_output_file, block_info, program_n
                 if all(c in '0123456789ABCDEF' for c in obj_code):
                     current_text_record.append(obj_code)
                     current_length += len(obj_code) // 2
-                    print(f"Added object code: {obj_code}, Current length: {current_length}")
+                    log(f"Added object code: {obj_code}, Current length: {current_length}")
                 else:
-                    print(f"Invalid object code format: {obj_code}")
+                    log(f"Invalid object code format: {obj_code}")
 
         except (ValueError, IndexError) as e:
             print(f"Error processing line: {e}")
@@ -138,39 +196,41 @@ def generate_htme_records(pass2_content, htme_output_file, block_info, program_n
 
     # Write final text record if any remains
     if current_text_record:
-        print(f"\nWriting final text record - Start: {current_start:X}, Length: {current_length}")
+        log(f"\nWriting final text record - Start: {current_start:X}, Length: {current_length}")
         text_records.append((current_start, current_length, "".join(current_text_record)))
 
-    # Get program length from the last location (loc is already an integer)
+    # The program ends where the last block ends
     try:
-        program_length = loc  # Changed from int(loc, 16) to just loc
-        print(f"\nProgram length: {program_length:X}")
-    except (ValueError, IndexError) as e:
+        program_length = max(int(info["Address"], 16) + int(info["Length"], 16) for info in block_info)
+        log(f"\nProgram length: {program_length:X}")
+    except ValueError as e:
         print(f"Error getting program length: {e}")
         return
 
-    print("\n=== Writing HTME Records to File ===")
-    with open(htme_output_file, 'w') as f:
+    log("\n=== Writing HTME Records to File ===")
+    with open_output(htme_output_file) as f:
         # Write header record
         header = f"H.{program_name:<6}.{start_address:06X}.{program_length:06X}"
-        print(f"Header record: {header}")
+        log(f"Header record: {header}")
         f.write(f"{header}\n")
         
         # Write text records
         for start, length, obj_code in text_records:
+            if not isinstance(obj_code, str):
+                obj_code = obj_code.hex().upper()  # A slice of an INCBIN file
             text_record = f"T.{start:06X}.{length:02X}.{obj_code}"
-            print(f"Text record: {text_record}")
+            log(f"Text record: {text_record}")
             f.write(f"{text_record}\n")
         
         # Write modification records
         for loc, length in modification_records:
             mod_record = f"M.{loc:06X}.{length}"
-            print(f"Modification record: {mod_record}")
+            log(f"Modification record: {mod_record}")
             f.write(f"{mod_record}\n")
         
         # Write end record
         end_record = f"E.{start_address:06X}"
-        print(f"End record: {end_record}")
+        log(f"End record: {end_record}")
         f.write(f"{end_record}\n")
 
-    print(f"\nHTME records written to {htme_output_file}")
\ No newline at end of file
+    log(f"\nHTME records written to {htme_output_file}")
\ No newline at end of file
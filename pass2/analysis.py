@@ -0,0 +1,145 @@
+import json
+from pass1.instructionSet import Mnemonic as OPCODE_TABLE
+from pass1.pass1 import VALID_BLOCKS, calculate_instruction_size
+
+BLOCK_NAMES = {number: name for name, number in VALID_BLOCKS.items()}
+
+FORMATS = ["1", "2", "3", "4", "4F"]
+
+# Estimated cycles per instruction. "formats" gives the cost of each
+# instruction format, "instructions" overrides it for slow mnemonics and the
+# extras are added for indirect and indexed addressing.
+DEFAULT_COST_TABLE = {
+    "formats": {"1": 1, "2": 2, "3": 3, "4": 4, "4F": 5},
+    "instructions": {
+        "MUL": 8, "MULF": 10, "DIV": 12, "DIVF": 14,
+        "MULR": 6, "DIVR": 10,
+        "RD": 10, "WD": 10, "TD": 6,
+        "SIO": 20, "HIO": 20, "TIO": 6, "SVC": 20,
+    },
+    "indirect_extra": 1,
+    "indexed_extra": 1,
+}
+
+
+def load_cost_table(path):
+    """Read a JSON cost table; missing entries fall back to DEFAULT_COST_TABLE"""
+    with open(path, 'r') as f:
+        overrides = json.load(f)
+    table = {key: (dict(value) if isinstance(value, dict) else value)
+             for key, value in DEFAULT_COST_TABLE.items()}
+    for key, value in overrides.items():
+        if isinstance(value, dict):
+            table.setdefault(key, {}).update(value)
+        else:
+            table[key] = value
+    return table
+
+
+def instruction_format(statement):
+    """Return '1', '2', '3', '4' or '4F' for an instruction, None for directives"""
+    mnemonic = statement.opcode.lstrip('+')
+    entry = OPCODE_TABLE.get(mnemonic)
+    if entry is None:
+        return None
+    if isinstance(entry, list):
+        return "4F" if entry[0] == 4 else str(entry[0])
+    return "4" if statement.opcode.startswith('+') else "3"
+
+
+def statement_size(statement):
+    if statement.object_code:
+        return len(statement.object_code) // 2
+    if statement.opcode in ("RESB", "RESW", "INCBIN"):
+        return calculate_instruction_size(statement.opcode, statement.operand)
+    return 0
+
+
+def statement_cycles(statement, fmt, cost_table):
+    if fmt is None:
+        return 0
+    mnemonic = statement.opcode.lstrip('+')
+    cycles = cost_table["instructions"].get(mnemonic, cost_table["formats"][fmt])
+    operand = statement.operand or ""
+    if fmt in ("3", "4"):
+        if operand.startswith('@'):
+            cycles += cost_table["indirect_extra"]
+        if operand.endswith(',X'):
+            cycles += cost_table["indexed_extra"]
+    return cycles
+
+
+def new_stats():
+    return {"bytes": 0, "reserved": 0, "instructions": 0,
+            "mix": {fmt: 0 for fmt in FORMATS}, "cycles": 0}
+
+
+def add_to_stats(stats, size, fmt, cycles, reserved):
+    if reserved:
+        stats["reserved"] += size
+    else:
+        stats["bytes"] += size
+    if fmt is not None:
+        stats["instructions"] += 1
+        stats["mix"][fmt] += 1
+        stats["cycles"] += cycles
+
+
+def analyze(encoded_statements, cost_table=None):
+    """Summarize sizes, instruction mix and estimated cycles.
+
+    encoded_statements are the EncodedStatements returned by pass2. Totals
+    are kept for the whole program, for every USE block and for every
+    labelled region; a region runs from a label to the next label in the
+    same block. Returns (report dict, per-statement annotations).
+    """
+    cost_table = cost_table or DEFAULT_COST_TABLE
+    report = {"program": new_stats(), "blocks": {}, "regions": {}}
+    open_regions = {}
+    annotations = []
+
+    for statement in encoded_statements:
+        block = BLOCK_NAMES.get(statement.block, str(statement.block))
+        if statement.label and statement.opcode not in ("EQU", "START", "END"):
+            open_regions[block] = statement.label
+            report["regions"][statement.label] = dict(new_stats(), block=block)
+
+        fmt = instruction_format(statement)
+        size = statement_size(statement)
+        cycles = statement_cycles(statement, fmt, cost_table)
+        reserved = statement.opcode in ("RESB", "RESW")
+        annotations.append((size, fmt, cycles))
+
+        if statement.opcode == "USE":
+            continue
+
+        add_to_stats(report["program"], size, fmt, cycles, reserved)
+        add_to_stats(report["blocks"].setdefault(block, new_stats()), size, fmt, cycles, reserved)
+        region = open_regions.get(block)
+        if region is not None:
+            add_to_stats(report["regions"][region], size, fmt, cycles, reserved)
+
+    return report, annotations
+
+
+def write_json_report(report, file):
+    json.dump(report, file, indent=2)
+    file.write("\n")
+
+
+def write_annotated_listing(encoded_statements, report, annotations, file):
+    """Write the statements with size, format and cycle columns, then the region totals"""
+    file.write("Loc   Block    Symbols      Instr       Reference        Bytes Fmt Cycles\n")
+    for statement, (size, fmt, cycles) in zip(encoded_statements, annotations):
+        line = (f"{statement.loc:05X}   {statement.block:<8}{statement.label:<12}"
+                f"{statement.opcode:<14}{statement.operand:<15}")
+        if size or fmt:
+            line += f"{size:>5} {fmt or '':<3} {cycles:>6}"
+        file.write(line.rstrip() + "\n")
+
+    for title, section in (("Block", report["blocks"]), ("Region", report["regions"])):
+        file.write(f"\n{title:<12}Bytes   Reserved  Instr   F1   F2   F3   F4  F4F   Cycles\n")
+        for name, stats in section.items():
+            mix = "".join(f"{stats['mix'][fmt]:>5}" for fmt in FORMATS)
+            file.write(f"{name:<12}{stats['bytes']:<8}{stats['reserved']:<10}{stats['instructions']:<6}"
+                       f"{mix}{stats['cycles']:>9}\n")
@@ -0,0 +1,223 @@
+"""Binary map from object-code addresses back to source lines.
+
+Layout (little-endian, every section 4-byte aligned):
+
+    header      magic "SXDM", version (u16), 0 (u16), entry count n (u32),
+                label count m (u32), size of the label names (u32),
+                file count f (u32), size of the file names (u32)
+    entries     address[n], size[n], line[n], label[n], file[n]  (u32 arrays),
+                block[n] (u8, padded to a multiple of 4)
+    labels      address[m], name offset[m + 1]  (u32 arrays),
+                then the UTF-8 names, padded to a multiple of 4
+    files       name offset[f + 1]  (u32 array), then the UTF-8 names
+
+Entries are sorted by absolute address and cover every statement that
+occupies memory. label is the index of the nearest label at or before the
+entry, or NO_LABEL. file indexes the source files; file 0 is the main
+source and has an empty name, the others are COPY/INCLUDE files. Line 0
+means the statement has no source line, as in literal pools.
+"""
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from pass2.analysis import statement_size
+from utilities import open_output
+
+MAGIC = b"SXDM"
+VERSION = 2
+HEADER = struct.Struct("<4sHHIIIII")
+NO_LABEL = 0xFFFFFFFF
+
+# What a lookup returns; offset is the distance from label's address and
+# source the included file holding the line ("" for the main source)
+DebugEntry = namedtuple("DebugEntry", "address size line block label offset source")
+
+
+def _u32(values):
+    data = array('I', values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _names(names):
+    """(u32 name offsets, UTF-8 blob) of a list of names"""
+    encoded = [name.encode() for name in names]
+    offsets = [0]
+    for name in encoded:
+        offsets.append(offsets[-1] + len(name))
+    return offsets, b"".join(encoded)
+
+
+def build_entries(encoded_statements, block_starts):
+    """(address, size, line, block, label, source) of every statement that takes memory, by address"""
+    entries = []
+    for statement in encoded_statements:
+        size = statement_size(statement)
+        if size:
+            address = block_starts.get(statement.block, 0) + statement.loc
+            entries.append((address, size, statement.line or 0, statement.block, statement.label,
+                            statement.source or ""))
+    entries.sort(key=lambda entry: entry[0])
+    return entries
+
+
+def write_debug_map(encoded_statements, block_starts, target):
+    """Write the debug map of pass2's EncodedStatements to a path or binary stream.
+
+    block_starts maps block numbers to their absolute start address.
+    """
+    entries = build_entries(encoded_statements, block_starts)
+
+    label_names = []
+    label_addresses = []
+    scopes = []
+    files = {"": 0}
+    for address, _, _, _, label, source in entries:
+        if label:
+            label_names.append(label)
+            label_addresses.append(address)
+        scopes.append(len(label_names) - 1 if label_names else NO_LABEL)
+        files.setdefault(source, len(files))
+
+    offsets, blob = _names(label_names)
+    file_offsets, file_blob = _names(list(files))
+
+    blocks = bytes(entry[3] for entry in entries)
+    blocks += bytes(-len(blocks) % 4)
+
+    with open_output(target, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(entries), len(label_names), len(blob),
+                            len(files), len(file_blob)))
+        f.write(_u32(entry[0] for entry in entries))
+        f.write(_u32(entry[1] for entry in entries))
+        f.write(_u32(entry[2] for entry in entries))
+        f.write(_u32(scopes))
+        f.write(_u32(files[entry[5]] for entry in entries))
+        f.write(blocks)
+        f.write(_u32(label_addresses))
+        f.write(_u32(offsets))
+        f.write(blob + bytes(-len(blob) % 4))
+        f.write(_u32(file_offsets))
+        f.write(file_blob)
+
+
+class DebugMap:
+    """Read-only view of a debug map file.
+
+    The file is memory-mapped and its arrays are used in place through
+    memoryview casts, so opening a map costs nothing per entry and each
+    lookup is one bisect over the address array.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        magic, version, _, count, label_count, names_size, file_count, files_size = HEADER.unpack_from(self.view)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} debug map")
+
+        offset = HEADER.size
+        self.addresses, offset = self._array(offset, count)
+        self.sizes, offset = self._array(offset, count)
+        self.lines, offset = self._array(offset, count)
+        self.labels, offset = self._array(offset, count)
+        self.files, offset = self._array(offset, count)
+        self.blocks = self.view[offset:offset + count]
+        offset += count + (-count % 4)
+        self.label_addresses, offset = self._array(offset, label_count)
+        self.name_offsets, offset = self._array(offset, label_count + 1)
+        self.names = self.view[offset:offset + names_size]
+        offset += names_size + (-names_size % 4)
+        self.file_offsets, offset = self._array(offset, file_count + 1)
+        self.file_names = self.view[offset:offset + files_size]
+
+    def _array(self, offset, count):
+        end = offset + 4 * count
+        data = self.view[offset:end].cast('I')
+        if sys.byteorder == 'big':
+            data = array('I', data)
+            data.byteswap()
+        return data, end
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def label_name(self, index):
+        return bytes(self.names[self.name_offsets[index]:self.name_offsets[index + 1]]).decode()
+
+    def file_name(self, index):
+        return bytes(self.file_names[self.file_offsets[index]:self.file_offsets[index + 1]]).decode()
+
+    def lookup(self, address):
+        """Return the DebugEntry of the statement covering address, or None"""
+        index = bisect_right(self.addresses, address) - 1
+        if index < 0 or address >= self.addresses[index] + self.sizes[index]:
+            return None
+        label_index = self.labels[index]
+        if label_index == NO_LABEL:
+            label, offset = "", address - self.addresses[index]
+        else:
+            label, offset = self.label_name(label_index), address - self.label_addresses[label_index]
+        return DebugEntry(self.addresses[index], self.sizes[index], self.lines[index],
+                          self.blocks[index], label, offset, self.file_name(self.files[index]))
+
+    def lookup_many(self, addresses):
+        return [self.lookup(address) for address in addresses]
+
+    def lookup_lines(self, addresses):
+        """Source line of each address, 0 where no statement covers it.
+
+        The cheap path for profilers: no DebugEntry and no label decoding.
+        Lines of included files are numbered within their own file.
+        """
+        starts, sizes, lines = self.addresses, self.sizes, self.lines
+        result = []
+        for address in addresses:
+            index = bisect_right(starts, address) - 1
+            result.append(lines[index] if index >= 0 and address < starts[index] + sizes[index] else 0)
+        return result
+
+    def describe(self, address):
+        """'LABEL+offset (line n)' for address, as a profiler would print it"""
+        entry = self.lookup(address)
+        if entry is None:
+            return f"{address:05X}"
+        name = f"{entry.label}+{entry.offset:X}" if entry.label else f"{entry.address:05X}"
+        source = f" of {entry.source}" if entry.source else ""
+        return f"{name} (line {entry.line}{source})"
+
+    def close(self):
+        # Drop the casts before the mapping they point into
+        self.addresses = self.sizes = self.lines = self.labels = self.files = self.blocks = None
+        self.label_addresses = self.name_offsets = self.names = self.file_offsets = self.file_names = None
+        self.view.release()
+        self.mmap.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve addresses with a debug map")
+    parser.add_argument("map", help="debug map written by pass2")
+    parser.add_argument("addresses", nargs="+", help="hex addresses")
+    args = parser.parse_args()
+
+    with DebugMap(args.map) as debug_map:
+        for address in args.addresses:
+            print(f"{address}\t{debug_map.describe(int(address, 16))}")
+
+
+if __name__ == "__main__":
+    main()
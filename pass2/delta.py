@@ -0,0 +1,218 @@
+"""Delta object output: only the bytes that changed since the previous build.
+
+A delta is itself an HTME file. Its header and end records are those of
+the new build, its T records cover just the address ranges whose bytes
+differ from (or were not loaded by) the previous object, and it keeps the
+M records that fall in those ranges. Loading it over the previous image,
+relocated or not, gives the new image.
+"""
+import argparse
+from bisect import bisect_right
+from pass2.disassembler import parse_htme
+from utilities import open_output
+
+MAX_TEXT_LENGTH = 30  # bytes per T record, as in Htme.py
+
+# Unchanged runs shorter than this are sent again rather than starting a new T record
+MIN_GAP = 6
+
+
+def build_image(text_records, length=0):
+    """Lay text records out from address 0; returns (image, loaded) where loaded marks written bytes.
+
+    The image is zero-filled up to at least length.
+    """
+    end = max((start + len(data) for start, data in text_records), default=0)
+    image = bytearray(max(end, length))
+    loaded = bytearray(len(image))
+    for start, data in text_records:
+        image[start:start + len(data)] = data
+        loaded[start:start + len(data)] = b"\x01" * len(data)
+    return image, loaded
+
+
+def field_range(location, half_bytes):
+    """[start, end) bytes of a modification field"""
+    return location, location + (half_bytes + 1) // 2
+
+
+def changed_ranges(old_image, old_loaded, new_image, new_loaded, chunk=4096):
+    """[start, end) ranges of the new image that differ from the old one.
+
+    A byte differs when its value changed or the old object did not load
+    it. Bytes the new object no longer loads count as changed when the old
+    image holds something other than zero there, so they are cleared.
+    """
+    old_image = old_image[:len(new_image)] + bytes(max(0, len(new_image) - len(old_image)))
+    old_loaded = old_loaded[:len(new_image)] + bytes(max(0, len(new_image) - len(old_loaded)))
+    ranges = []
+    for block in range(0, len(new_image), chunk):
+        block_end = min(block + chunk, len(new_image))
+        if (new_image[block:block_end] == old_image[block:block_end]
+                and new_loaded[block:block_end] == old_loaded[block:block_end]):
+            continue
+        for position in range(block, block_end):
+            if new_image[position] == old_image[position] and (old_loaded[position] or not new_loaded[position]):
+                continue
+            if ranges and ranges[-1][1] == position:
+                ranges[-1][1] = position + 1
+            elif (ranges and position - ranges[-1][1] < MIN_GAP
+                  and all(new_loaded[ranges[-1][1]:position])):
+                ranges[-1][1] = position + 1
+            else:
+                ranges.append([position, position + 1])
+    return ranges
+
+
+def overlaps(ranges, field):
+    """True when field shares a byte with one of the sorted, disjoint ranges"""
+    field_start, field_end = field
+    index = bisect_right([start for start, _ in ranges], field_end - 1) - 1
+    return index >= 0 and field_start < ranges[index][1]
+
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(map(tuple, ranges)):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def make_delta(old_htme, new_htme):
+    """Compare two HTME objects; returns (delta records, number of bytes in its T records).
+
+    Every modification field that is touched at all is sent whole, so
+    relocating the delta's M records after loading it gives the same value
+    as relocating a fresh build. The T records always reach the end of the
+    new image, which tells apply_delta where to cut an image that shrank.
+    """
+    (_, old_start, old_length), old_records, old_modifications, _ = parse_htme(old_htme)
+    header, new_records, modifications, end_address = parse_htme(new_htme)
+    name, start, length = header
+    old_image, old_loaded = build_image(old_records, old_start + old_length)
+    image, loaded = build_image(new_records, start + length)
+    ranges = changed_ranges(old_image, old_loaded, image, loaded)
+
+    # A field relocated in only one of the builds is resent even when its bytes match
+    fields = [field_range(*m) for m in modifications]
+    touched = [field for field in fields if overlaps(ranges, field)]
+    touched += [field_range(*m) for m in set(old_modifications) ^ set(modifications)]
+    if len(image):
+        touched.append((len(image) - 1, len(image)))
+    ranges = [[range_start, min(range_end, len(image))]
+              for range_start, range_end in merge_ranges(ranges + touched) if range_start < len(image)]
+
+    records = [f"H.{name:<6}.{start:06X}.{length:06X}"]
+    changed = 0
+    for range_start, range_end in ranges:
+        changed += range_end - range_start
+        for chunk in range(range_start, range_end, MAX_TEXT_LENGTH):
+            data = image[chunk:min(chunk + MAX_TEXT_LENGTH, range_end)]
+            records.append(f"T.{chunk:06X}.{len(data):02X}.{data.hex().upper()}")
+
+    # Fields in patched bytes must be relocated again by whoever applies the delta
+    starts = [range_start for range_start, _ in ranges]
+    for location, half_bytes in modifications:
+        index = bisect_right(starts, location) - 1
+        if index >= 0 and location < ranges[index][1]:
+            records.append(f"M.{location:06X}.{half_bytes:02X}")
+    records.append(f"E.{end_address if end_address is not None else start:06X}")
+    return records, changed
+
+
+def write_delta(old_htme, new_htme, target):
+    """Write the delta between two HTME objects (paths or streams); returns the bytes changed"""
+    records, changed = make_delta(old_htme, new_htme)
+    with open_output(target) as f:
+        for record in records:
+            f.write(record + "\n")
+    return changed
+
+
+def relocate(image, modifications, origin, offset):
+    """Add offset to every modification field; image holds the program loaded at origin"""
+    for location, half_bytes in modifications:
+        position = location - origin
+        size = (half_bytes + 1) // 2
+        mask = (1 << (4 * half_bytes)) - 1
+        value = int.from_bytes(image[position:position + size], 'big')
+        value = (value & ~mask) | ((value + offset) & mask)
+        image[position:position + size] = value.to_bytes(size, 'big')
+
+
+def load_image(htme, load_address=None):
+    """Memory image of a full HTME object, relocated to load_address when given.
+
+    The image runs from the start address to the end of the program length
+    or of the last text record, whichever is further.
+    """
+    (_, start, length), records, modifications, _ = parse_htme(htme)
+    image, _ = build_image(records, start + length)
+    del image[:start]
+    if load_address is not None and load_address != start:
+        relocate(image, modifications, start, load_address - start)
+    return image
+
+
+def apply_delta(image, delta, load_address=None):
+    """Patch image, the previous build loaded from its start address, with a delta object.
+
+    The image is resized to the new build's, so bytes past the end of a
+    program that shrank are dropped. Returns the patched image (the same
+    bytearray).
+    """
+    (_, start, length), records, modifications, _ = parse_htme(delta)
+    end = max([length] + [address - start + len(data) for address, data in records])
+    if len(image) > end:
+        del image[end:]
+    else:
+        image.extend(bytes(end - len(image)))
+    for address, data in records:
+        position = address - start
+        image[position:position + len(data)] = data
+    if load_address is not None and load_address != start:
+        relocate(image, modifications, start, load_address - start)
+    return image
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delta object output for SIC/XE programs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    diff = commands.add_parser("diff", help="write the delta between two HTME files")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("-o", "--output", required=True)
+
+    image = commands.add_parser("image", help="write the memory image of an HTME file")
+    image.add_argument("htme")
+    image.add_argument("-o", "--output", required=True)
+    image.add_argument("--load-address", type=lambda value: int(value, 16))
+
+    apply = commands.add_parser("apply", help="patch a memory image with a delta")
+    apply.add_argument("image")
+    apply.add_argument("delta")
+    apply.add_argument("-o", "--output", help="defaults to patching the image in place")
+    apply.add_argument("--load-address", type=lambda value: int(value, 16))
+
+    args = parser.parse_args()
+    if args.command == "diff":
+        changed = write_delta(args.old, args.new, args.output)
+        print(f"Delta written to {args.output}: {changed} bytes changed")
+    elif args.command == "image":
+        with open(args.output, 'wb') as f:
+            f.write(load_image(args.htme, args.load_address))
+        print(f"Memory image written to {args.output}")
+    else:
+        with open(args.image, 'rb') as f:
+            patched = apply_delta(bytearray(f.read()), args.delta, args.load_address)
+        with open(args.output or args.image, 'wb') as f:
+            f.write(patched)
+        print(f"Patched image written to {args.output or args.image}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pass1.instructionSet import Mnemonic as OPCODE_TABLE
+from pass1.symbol_index import SymbolIndex
+from pass2.pass2 import REGISTERS, CONDITION_FLAGS
+from utilities import open_input
+
+REGISTER_NAMES = {int(code): name for name, code in REGISTERS.items()}
+CONDITION_NAMES = {int(bits, 2): flag for flag, bits in CONDITION_FLAGS.items()}
+
+# Format 2 instructions that take a single register operand
+SINGLE_REGISTER = {"CLEAR", "TIXR", "SVC"}
+
+
+def build_decode_tables():
+    """Invert the opcode table into opcode value -> (mnemonic, format)"""
+    format_1_2 = {}
+    format_3 = {}
+    format_4f = {}
+    for mnemonic, entry in OPCODE_TABLE.items():
+        if isinstance(entry, list):
+            fmt, opcode = entry[0], int(entry[1], 16)
+            if fmt in (1, 2):
+                format_1_2[opcode] = (mnemonic, fmt)
+            else:
+                format_4f[opcode] = mnemonic
+        else:
+            format_3[int(entry, 16)] = mnemonic
+    return format_1_2, format_3, format_4f
+
+
+FORMAT_1_2, FORMAT_3, FORMAT_4F = build_decode_tables()
+
+
+def parse_htme(htme_file):
+    """Read an HTME file (path or stream) into header, text records, modification records and end address"""
+    header = None
+    text_records = []
+    modifications = []
+    end_address = None
+    with open_input(htme_file) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            parts = line.split('.')
+            record_type = parts[0]
+            if record_type == 'H' and len(parts) >= 4:
+                header = (parts[1].strip(), int(parts[2], 16), int(parts[3], 16))
+            elif record_type == 'T' and len(parts) >= 4:
+                text_records.append((int(parts[1], 16), bytes.fromhex(parts[3])))
+            elif record_type == 'M' and len(parts) >= 3:
+                modifications.append((int(parts[1], 16), int(parts[2], 16)))
+            elif record_type == 'E' and len(parts) >= 2:
+                end_address = int(parts[1], 16)
+    return header, text_records, modifications, end_address
+
+
+def format_target(address, symbols):
+    if symbols is not None and len(symbols):
+        return symbols.describe(address)
+    return f"{address:X}"
+
+
+def decode_instruction(data, pos, address, symbols=None):
+    """Decode one instruction at data[pos].
+
+    Returns (length, mnemonic, operand). Bytes that do not start a known
+    instruction are returned as a one byte BYTE constant.
+    """
+    first = data[pos]
+    remaining = len(data) - pos
+
+    if first in FORMAT_1_2:
+        mnemonic, fmt = FORMAT_1_2[first]
+        if fmt == 1:
+            return 1, mnemonic, ""
+        if remaining >= 2:
+            r1, r2 = data[pos + 1] >> 4, data[pos + 1] & 0x0F
+            if mnemonic in SINGLE_REGISTER:
+                return 2, mnemonic, REGISTER_NAMES.get(r1, str(r1))
+            return 2, mnemonic, f"{REGISTER_NAMES.get(r1, str(r1))},{REGISTER_NAMES.get(r2, str(r2))}"
+
+    opcode = first & 0xFC
+
+    if opcode in FORMAT_4F and remaining >= 4:
+        nibble = data[pos + 1] >> 4
+        register = ((first & 0x03) << 2) | (nibble >> 2)
+        condition = CONDITION_NAMES[nibble & 0x03]
+        target = ((data[pos + 1] & 0x0F) << 16) | (data[pos + 2] << 8) | data[pos + 3]
+        reg_name = REGISTER_NAMES.get(register, str(register))
+        return 4, FORMAT_4F[opcode], f"{reg_name},{format_target(target, symbols)},{condition}"
+
+    if opcode in FORMAT_3 and remaining >= 3:
+        mnemonic = FORMAT_3[opcode]
+        n, i = (first >> 1) & 1, first & 1
+        flags = data[pos + 1] >> 4
+        x, b, p, e = (flags >> 3) & 1, (flags >> 2) & 1, (flags >> 1) & 1, flags & 1
+
+        if e:
+            if remaining < 4:
+                return 1, "BYTE", f"X'{first:02X}'"
+            length = 4
+            mnemonic = "+" + mnemonic
+            value = ((data[pos + 1] & 0x0F) << 16) | (data[pos + 2] << 8) | data[pos + 3]
+        else:
+            length = 3
+            value = ((data[pos + 1] & 0x0F) << 8) | data[pos + 2]
+
+        if mnemonic == "RSUB":
+            return length, mnemonic, ""
+
+        if p:
+            if value & 0x800:
+                value -= 0x1000
+            operand = format_target(address + length + value, symbols)
+        elif b:
+            operand = f"{value:X}(B)"
+        elif n == 0 and i == 1:
+            operand = str(value)
+        else:
+            operand = format_target(value, symbols)
+
+        if n == 0 and i == 1:
+            operand = "#" + operand
+        elif n == 1 and i == 0:
+            operand = "@" + operand
+        if x:
+            operand += ",X"
+        return length, mnemonic, operand
+
+    return 1, "BYTE", f"X'{first:02X}'"
+
+
+def disassemble(htme_file, symb_table_file=None):
+    """Disassemble an HTME object program into listing lines"""
+    header, text_records, modifications, end_address = parse_htme(htme_file)
+    symbols = None
+    if symb_table_file and os.path.exists(symb_table_file):
+        symbols = SymbolIndex.from_symbol_file(symb_table_file)
+
+    lines = []
+    if header:
+        name, start, length = header
+        lines.append(f"{start:06X}  {name:<8} START    {start:X}")
+        lines.append(f".        program length {length:06X}")
+
+    for start, data in text_records:
+        lines.append(f".        text record {start:06X} length {len(data):02X}")
+        pos = 0
+        while pos < len(data):
+            address = start + pos
+            length, mnemonic, operand = decode_instruction(data, pos, address, symbols)
+            label = ""
+            if symbols is not None:
+                found = symbols.nearest(address)
+                if found and found[1] == 0:
+                    label = found[0]
+            obj_code = data[pos:pos + length].hex().upper()
+            lines.append(f"{address:06X}  {label:<8} {mnemonic:<8} {operand:<20} {obj_code}".rstrip())
+            pos += length
+
+    for location, half_bytes in modifications:
+        lines.append(f".        modification {location:06X} length {half_bytes:02X}")
+
+    if end_address is not None:
+        lines.append(f"{'':6}  {'':<8} END      {format_target(end_address, symbols)}")
+    return lines
+
+
+def write_disassembly(htme_file, output_file, symb_table_file=None):
+    lines = disassemble(htme_file, symb_table_file)
+    with open(output_file, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    return output_file
+
+
+def _disassemble_job(job):
+    htme_file, output_file, symb_table_file = job
+    try:
+        return write_disassembly(htme_file, output_file, symb_table_file), None
+    except (OSError, ValueError, IndexError) as e:
+        return htme_file, str(e)
+
+
+def disassemble_directory(input_dir, output_dir, pattern="HTME.txt", jobs=None):
+    """Disassemble every object file under input_dir using a pool of worker processes.
+
+    A symbTable.txt next to an object file is used for labels. Results are
+    written to output_dir, mirroring the input layout.
+    """
+    work = []
+    for root, _, files in os.walk(input_dir):
+        for name in sorted(files):
+            if name != pattern and not name.endswith(".obj"):
+                continue
+            htme_file = os.path.join(root, name)
+            relative = os.path.relpath(htme_file, input_dir)
+            output_file = os.path.join(output_dir, os.path.splitext(relative)[0] + ".dis.txt")
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            symb_table_file = os.path.join(root, "symbTable.txt")
+            work.append((htme_file, output_file, symb_table_file))
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for path, error in pool.map(_disassemble_job, work, chunksize=8):
+            if error:
+                print(f"Error disassembling {path}: {error}")
+            results.append((path, error))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Disassemble SIC/XE HTME object programs")
+    parser.add_argument("path", help="HTME file, or a directory with --batch")
+    parser.add_argument("-s", "--symbols", help="symbol table written by pass 1")
+    parser.add_argument("-o", "--output", help="output file (directory with --batch)")
+    parser.add_argument("--batch", action="store_true", help="disassemble every object file under path")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes for --batch")
+    args = parser.parse_args()
+
+    if args.batch:
+        output_dir = args.output or os.path.join(args.path, "disassembly")
+        results = disassemble_directory(args.path, output_dir, jobs=args.jobs)
+        print(f"Disassembled {sum(1 for _, error in results if not error)} of {len(results)} files into {output_dir}")
+        return
+
+    symb_table_file = args.symbols or os.path.join(os.path.dirname(args.path), "symbTable.txt")
+    if args.output:
+        write_disassembly(args.path, args.output, symb_table_file)
+    else:
+        print("\n".join(disassemble(args.path, symb_table_file)))
+
+
+if __name__ == "__main__":
+    main()
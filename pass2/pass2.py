@@ -1,5 +1,13 @@
 import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from pass1.instructionSet import Mnemonic as OPCODE_TABLE
+from pass1.listing import read_listing
+from pass1.pass1 import AssemblerError, format3_displacement
+from pass1.symbol_index import SymbolIndex
+from pass2.vectorized import vectorized_available, encode_format34_batch
+from pass2.debug_map import write_debug_map
+from utilities import open_input, open_output
 
 # Register mapping
 REGISTERS = {
@@ -15,92 +23,160 @@ CONDITION_FLAGS = {
     'V': '11'   # Equal
 }
 
-def pass2(intermediate_file, symb_table_file, output_file):
-    """Main pass2 function that will be called from main.py"""
-    symbol_table = load_symbol_table(symb_table_file)
+# A pass 1 statement together with the object code pass2 produced for it
+EncodedStatement = namedtuple("EncodedStatement", "loc block label opcode operand line source object_code")
+
+def pass2(intermediate_file, symb_table_file, output_file, statements=None, vectorized=False, jobs=1,
+          debug_map_file=None, symbols=None):
+    """Encode pass1's statements, write the pass 2 listing and return the EncodedStatements after START.
+
+    intermediate_file  pass1's listing, read back when statements is None
+    symb_table_file    pass1's symbTable.txt; its symbol section is only read when symbols is None
+    output_file        receives the pass 2 listing
+    statements         pass1's ListingRows, encoded by position so repeated identical lines are kept
+    vectorized         encode format 3/4 instructions in bulk with NumPy when it is installed
+    jobs               spread the remaining statements over this many processes
+    debug_map_file     path or binary stream for the address to source line map of debug_map.py;
+                       source lines are only known when statements come from pass1
+    symbols            pass1's SymbolIndex; errors name addresses through it as SYMBOL+offset
+    """
+    if symbols is None:
+        symbols = SymbolIndex.from_symbol_file(symb_table_file)
+    symbol_table = {name: f"{address:05X}" for name, (address, _) in symbols.symbols.items()}
     literal_table = load_literal_table(symb_table_file)
-    base_register = None
-    
-    with open(intermediate_file, 'r') as f:
-        input_lines = [line.strip() for line in f.readlines() if line.strip()]
-        input_lines = list(dict.fromkeys(input_lines))
-
-    output_lines = []
-    output_lines.append("Loc   Block    Symbols      Instr       Reference        Object Code")
+    block_starts = load_block_starts(symb_table_file)
 
-    for line in input_lines[1:]:
-        parts = line.split()
-        if len(parts) < 2:
-            continue
+    if statements is None:
+        statements = read_listing(intermediate_file)
 
-        location = parts[0][:4]
-        block = parts[0][4:] if len(parts[0]) > 4 else parts[1]
+    # The first statement is START
+    body = statements[1:]
+    base_registers = track_base_registers(body, symbol_table)
 
-        label = ''
-        instruction = ''
-        operand = ''
-        object_code = ''
+    precomputed = {}
+    if vectorized:
+        if vectorized_available():
+            precomputed = encode_format34_batch(body, base_registers, symbol_table, literal_table, block_starts)
+        else:
+            print("NumPy is not installed; using the scalar encoder")
 
-        remaining_parts = parts[1:] if len(parts[0]) > 4 else parts[2:]
-        
-        if remaining_parts:
-            if len(remaining_parts) == 1:
-                instruction = remaining_parts[0]
-            else:
-                if len(remaining_parts) >= 2 and remaining_parts[1] in ['START', 'END', 'RESW', 'RESB', 'BYTE', 'WORD', 'BASE', 'USE'] + list(OPCODE_TABLE.keys()):
-                    label = remaining_parts[0]
-                    instruction = remaining_parts[1]
-                    if len(remaining_parts) > 2:
-                        operand = remaining_parts[2]
-                else:
-                    instruction = remaining_parts[0]
-                    if len(remaining_parts) > 1:
-                        operand = remaining_parts[1]
-
-        # Handle literals in LTORG section
-        if instruction == '*':
-            if operand and operand.startswith('='):
-                if operand.startswith('=C\'') and operand.endswith('\''):
-                    chars = operand[3:-1]
-                    object_code = ''.join([format(ord(c), '02X') for c in chars])
-                elif operand.startswith('=X\'') and operand.endswith('\''):
-                    object_code = operand[3:-1]
-        elif instruction == 'BASE':
-            if operand in symbol_table:
-                base_register = symbol_table[operand]
-        elif instruction == 'BYTE':
-            object_code = handle_byte_directive(operand)
-        elif instruction == 'WORD':
-            try:
-                value = int(operand)
-                object_code = format(value, '06X')
-            except ValueError:
-                print(f"ERROR: Invalid WORD operand: {operand}")
-                object_code = None
-        elif instruction in OPCODE_TABLE or (instruction.startswith('+') and instruction[1:] in OPCODE_TABLE):
-            object_code = generate_object_code(location, instruction, operand, symbol_table, literal_table, base_register)
-
-        output_line = f"{location:<8}"
-        output_line += f"{block:<8}"
-        output_line += f"{label:<12}"
-        output_line += f"{instruction:<14}"
-
-        if instruction == 'RSUB':
-            output_line += " "*15
-        elif operand:
-            output_line += f"{operand:<15}"
+    # Symbols are absolute, so each statement is encoded at its absolute address
+    work = [(pos, f"{block_starts.get(statement.block, 0) + statement.loc:05X}", statement.opcode,
+             statement.operand, base_registers[pos])
+            for pos, statement in enumerate(body) if pos not in precomputed]
+    try:
+        if jobs > 1 and len(work) >= jobs * MIN_STATEMENTS_PER_JOB:
+            encoded = encode_parallel(work, symbol_table, literal_table, jobs)
         else:
-            output_line += " "*15
-            
-        if object_code:
-            output_line += f"{object_code}"
-            
-        output_lines.append(output_line)
+            encoded = [encode_statement(location, instruction, operand, symbol_table, literal_table, base_register)
+                       for _, location, instruction, operand, base_register in work]
+    except AddressRangeError as e:
+        raise AssemblerError(describe_range_error(e, symbols)) from None
+    for (pos, *_), object_code in zip(work, encoded):
+        precomputed[pos] = object_code
+
+    output_lines = []
+    output_lines.append("Loc   Block    Symbols      Instr       Reference        Object Code")
+
+    for pos, statement in enumerate(body):
+        output_lines.append(format_output_line(f"{statement.loc:05X}", str(statement.block), statement.label,
+                                               statement.opcode, statement.operand, precomputed[pos]))
 
-    with open(output_file, 'w') as f:
+    with open_output(output_file) as f:
         for line in output_lines:
             f.write(line + '\n')
 
+    encoded_statements = [EncodedStatement(*statement, precomputed[pos]) for pos, statement in enumerate(body)]
+    if debug_map_file is not None:
+        write_debug_map(encoded_statements, block_starts, debug_map_file)
+    return encoded_statements
+
+# Below this many statements per worker the process pool costs more than it saves
+MIN_STATEMENTS_PER_JOB = 2000
+
+_worker_tables = None
+
+def _init_worker(symbol_table, literal_table):
+    global _worker_tables
+    _worker_tables = (symbol_table, literal_table)
+
+def _encode_chunk(chunk):
+    symbol_table, literal_table = _worker_tables
+    return [encode_statement(location, instruction, operand, symbol_table, literal_table, base_register)
+            for _, location, instruction, operand, base_register in chunk]
+
+def encode_parallel(work, symbol_table, literal_table, jobs):
+    """Encode (pos, location, instruction, operand, base register) items in a process pool.
+
+    Every symbol and literal address is fixed after pass1 and the base
+    register is precomputed per position, so chunks are independent. The
+    tables are sent to each worker once and results come back in order.
+    """
+    chunk_size = -(-len(work) // jobs)
+    chunks = [work[start:start + chunk_size] for start in range(0, len(work), chunk_size)]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(symbol_table, literal_table)) as pool:
+        return [object_code for chunk in pool.map(_encode_chunk, chunks) for object_code in chunk]
+
+def track_base_registers(statements, symbol_table):
+    """Return the base register value in effect at each statement"""
+    base_register = None
+    base_registers = []
+    for statement in statements:
+        if statement.opcode == 'BASE':
+            if statement.operand in symbol_table:
+                base_register = symbol_table[statement.operand]
+        base_registers.append(base_register)
+    return base_registers
+
+def encode_statement(location, instruction, operand, symbol_table, literal_table, base_register=None):
+    """Return the object code for one statement, or '' when it has none"""
+    object_code = ''
+
+    # Handle literals in LTORG section
+    if instruction == '*':
+        if operand and operand.startswith('='):
+            if operand.startswith('=C\'') and operand.endswith('\''):
+                chars = operand[3:-1]
+                object_code = ''.join([format(ord(c), '02X') for c in chars])
+            elif operand.startswith('=X\'') and operand.endswith('\''):
+                object_code = operand[3:-1]
+    elif instruction == 'BYTE':
+        object_code = handle_byte_directive(operand)
+    elif instruction == 'WORD':
+        try:
+            value = int(operand)
+            object_code = format(value, '06X')
+        except ValueError:
+            print(f"ERROR: Invalid WORD operand: {operand}")
+            object_code = None
+    elif instruction in OPCODE_TABLE or (instruction.startswith('+') and instruction[1:] in OPCODE_TABLE):
+        try:
+            object_code = generate_object_code(location, instruction, operand, symbol_table, literal_table,
+                                               base_register)
+        except AddressRangeError as e:
+            raise AddressRangeError(e.target_address, location, instruction, operand) from None
+
+    return object_code
+
+def format_output_line(location, block, label, instruction, operand, object_code):
+    output_line = f"{location:<8}"
+    output_line += f"{block:<8}"
+    output_line += f"{label:<12}"
+    output_line += f"{instruction:<14}"
+
+    if instruction == 'RSUB':
+        output_line += " "*15
+    elif operand:
+        output_line += f"{operand:<15}"
+    else:
+        output_line += " "*15
+
+    if object_code:
+        output_line += f"{object_code}"
+
+    return output_line
+
 def generate_4f_object_code(opcode, register, condition, address):
     opcode_bin = format(int(opcode, 16), '08b')[:-2]
     reg_hex = REGISTERS.get(register, '0')
@@ -111,12 +187,12 @@ def generate_4f_object_code(opcode, register, condition, address):
     
     if isinstance(address, str):
         try:
-            addr_hex = format(int(address, 16), '04X').zfill(5)
+            addr_hex = format(int(address, 16), '05X')
         except ValueError as e:
             print(f"Error converting address: {e}")
             raise
     else:
-        addr_hex = format(address, '04X').zfill(5)
+        addr_hex = format(address, '05X')
     
     return f"{first_byte}{second_byte}{addr_hex}"
 
@@ -149,26 +225,23 @@ def handle_4f_instruction(instruction, operand, symbol_table):
     
     return generate_4f_object_code(opcode_value, register, condition, address)
 
-def load_symbol_table(symb_table_file):
-    symbol_table = {}
-    with open(symb_table_file, 'r') as f:
-        lines = f.readlines()
-        symbol_section = False
-        for line in lines:
-            if line.startswith('Symbol\tValue'):
-                symbol_section = True
+def load_block_starts(symb_table_file):
+    """Map block numbers to their start address from the block section"""
+    block_starts = {}
+    with open_input(symb_table_file) as f:
+        for line in f:
+            if line.startswith('Block name'):
                 continue
-            if symbol_section and line.strip():
-                parts = line.strip().split('\t')
-                if len(parts) >= 2:
-                    symbol = parts[0]
-                    value = parts[1]
-                    symbol_table[symbol] = value
-    return symbol_table
+            if not line.strip():
+                break
+            parts = line.strip().split('\t')
+            if len(parts) >= 4:
+                block_starts[int(parts[1])] = int(parts[2], 16)
+    return block_starts
 
 def load_literal_table(symb_table_file):
     literal_table = {}
-    with open(symb_table_file, 'r') as f:
+    with open_input(symb_table_file) as f:
         lines = f.readlines()
         literal_section = False
         for line in lines:
@@ -184,6 +257,11 @@ def load_literal_table(symb_table_file):
                     literal_table[literal] = (address, value)
     return literal_table
 
+def is_format_4f(instruction):
+    """True for the 4F instructions (CADD, CSUB, CLOAD, CSTORE, CJUMP), listed as [4, opcode]"""
+    entry = OPCODE_TABLE.get(instruction)
+    return isinstance(entry, list) and entry[0] in (4, '4F')
+
 def get_opcode_value(opcode):
     if isinstance(opcode, list):
         format_type = opcode[0]
@@ -200,7 +278,7 @@ def get_opcode_value(opcode):
 def get_instruction_format(instruction, opcode):
     if isinstance(opcode, list):
         return opcode[0]
-    if instruction in OPCODE_TABLE and isinstance(OPCODE_TABLE[instruction], list) and OPCODE_TABLE[instruction][0] == '4F':
+    if is_format_4f(instruction):
         return '4F'
     return 3
 
@@ -235,27 +313,49 @@ def handle_byte_directive(operand):
         return hex_values
     return None
 
+class AddressRangeError(AssemblerError):
+    """Raised when a format 3 operand is out of reach of every addressing mode"""
+    def __init__(self, target_address, location="", instruction="", operand=""):
+        super().__init__(target_address, location, instruction, operand)
+        self.target_address = target_address
+        self.location = location
+        self.instruction = instruction
+        self.operand = operand
+
+    def describe(self, location=None, target=None):
+        """The error message; location and target replace the bare hex addresses when given"""
+        return (f"Error at {location or self.location}: {self.instruction} {self.operand} cannot reach "
+                f"{target or format(self.target_address, '05X')} with PC-relative, base-relative or direct "
+                f"addressing; use +{self.instruction.lstrip('+')} or a BASE directive")
+
+    def __str__(self):
+        return self.describe()
+
+def describe_range_error(error, symbols):
+    """Message for an AddressRangeError with both addresses given as SYMBOL+offset"""
+    address = int(error.location, 16)
+    location = f"{address:05X} ({symbols.describe(address)})"
+    target = f"{error.target_address:05X} ({symbols.describe(error.target_address)})"
+    return error.describe(location, target)
+
 def calculate_displacement(target_address, current_location, format_type, base_register=None):
+    """Return (displacement, b, p, e) for a format 3/4 operand.
+
+    current_location is the statement's address in hex, in the same frame
+    as target_address: absolute in pass2, where every symbol is absolute.
+    """
     if format_type == 4:
         return target_address, 0, 0, 1
-    
-    try:
-        pc = int(current_location, 16) + 3
-        
-        if isinstance(target_address, str):
-            target_address = int(target_address, 16)
-            
-        disp = target_address - pc
-        
-        if -2048 <= disp <= 2047:
-            return disp, 0, 1, 0
-        elif base_register and 0 <= (target_address - int(base_register, 16)) <= 4095:
-            return target_address - int(base_register, 16), 1, 0, 0
-        else:
-            return target_address & 0xFFF, 0, 0, 0
-            
-    except ValueError as e:
-        raise
+
+    if isinstance(target_address, str):
+        target_address = int(target_address, 16)
+    base_address = int(base_register, 16) if base_register else None
+
+    found = format3_displacement(target_address, int(current_location, 16), base_address)
+    if found is None:
+        raise AddressRangeError(target_address)
+    disp, b, p = found
+    return disp, b, p, 0
 
 def generate_object_code(location, instruction, operand, symbol_table, literal_table, base_register=None):
     is_format_4 = instruction.startswith('+')
@@ -269,7 +369,7 @@ def generate_object_code(location, instruction, operand, symbol_table, literal_t
         print(f"WARNING: Instruction {instruction} not found in OPCODE_TABLE")
         return None
 
-    if isinstance(OPCODE_TABLE[instruction], list) and OPCODE_TABLE[instruction][0] == '4F':
+    if is_format_4f(instruction):
         return handle_4f_instruction(instruction, operand, symbol_table)
 
     opcode = OPCODE_TABLE[instruction]
@@ -0,0 +1,137 @@
+"""Optional NumPy backend that encodes format 3/4 instructions in bulk.
+
+Statements the batch encoder does not cover (RSUB, numeric immediates,
+formats 1, 2 and 4F, directives) are left to the scalar encoder in
+pass2.py, which remains the reference for the exact output.
+"""
+from itertools import repeat
+from pass1.instructionSet import Mnemonic as OPCODE_TABLE
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; pass2 falls back to the scalar encoder
+    np = None
+
+
+def vectorized_available():
+    return np is not None
+
+
+def _is_number(value):
+    return value.isdigit() or (value.startswith('-') and value[1:].isdigit())
+
+
+# Instruction -> opcode with the n/i bits cleared, plus 0x100 for format 4; every format 3/4 mnemonic but RSUB
+ENCODABLE = {prefix + mnemonic: (int(entry, 16) & 0xFC) | (0x100 if prefix else 0)
+             for mnemonic, entry in OPCODE_TABLE.items() if isinstance(entry, str) and mnemonic != 'RSUB'
+             for prefix in ('', '+')}
+
+# (n, i, x, target) of operands the batch encoder leaves alone
+SKIPPED = (-1, 0, 0, 0)
+
+
+def addressing(operand, symbol_values, literal_values):
+    """(n, i, x, target) of a format 3/4 operand, or SKIPPED when the batch encoder leaves it alone"""
+    if not operand:
+        return 1, 1, 0, 0
+    if operand.startswith('#'):
+        n, i, x, name = 0, 1, 0, operand[1:]
+        if _is_number(name):
+            return SKIPPED
+    elif operand.startswith('@'):
+        n, i, x, name = 1, 0, 0, operand[1:]
+    elif ',X' in operand:
+        n, i, x, name = 1, 1, 1, operand.split(',')[0]
+    else:
+        n, i, x, name = 1, 1, 0, operand
+
+    if name.startswith('=') and n == 1:
+        return n, i, x, literal_values.get(name, 0)
+    return n, i, x, symbol_values.get(name, 0)
+
+
+def gather_format34(statements, base_registers, symbol_table, literal_table, block_starts=None):
+    """Collect the columns of every statement the batch encoder can handle.
+
+    Opcodes, operands and base registers repeat, so each distinct value is
+    decoded once into a small table; the per-statement work is one C-level
+    map over each field and a NumPy gather from those tables. Returns
+    (positions, columns) where columns holds arrays of opcode, extended,
+    n, i, x, target, location and base register (-1 when none). Locations
+    are absolute: block_starts maps block numbers to their start address.
+    """
+    symbol_values = {name: int(value, 16) for name, value in symbol_table.items()
+                     if all(c in '0123456789ABCDEFabcdef' for c in value)}
+    literal_values = {name: int(address, 16) for name, (address, _) in literal_table.items()}
+
+    count = len(statements)
+    if not count:
+        return np.zeros(0, dtype=np.int64), {}
+    locations, blocks, _, opcodes, operands = list(zip(*statements))[:5]
+    starts = block_starts or {}
+
+    opcode = np.fromiter(map(ENCODABLE.get, opcodes, repeat(-1)), np.int64, count)
+
+    operand_ids = {operand: k for k, operand in enumerate(set(operands))}
+    modes = np.array([addressing(operand, symbol_values, literal_values) for operand in operand_ids],
+                     dtype=np.int64)[np.fromiter(map(operand_ids.__getitem__, operands), np.int64, count)]
+
+    base_values = {base: int(base, 16) if base else -1 for base in set(base_registers)}
+    base = np.fromiter(map(base_values.__getitem__, base_registers), np.int64, count)
+
+    positions = np.flatnonzero((opcode >= 0) & (modes[:, 0] >= 0))
+    opcode = opcode[positions]
+    modes = modes[positions]
+    columns = {
+        "opcode": opcode & 0xFF,
+        "extended": (opcode >> 8).astype(bool),
+        "n": modes[:, 0],
+        "i": modes[:, 1],
+        "x": modes[:, 2],
+        "target": modes[:, 3],
+        "location": (np.fromiter(locations, np.int64, count)
+                     + np.fromiter(map(starts.get, blocks, repeat(0)), np.int64, count))[positions],
+        "base": base[positions],
+    }
+    return positions, columns
+
+
+def encode_format34_batch(statements, base_registers, symbol_table, literal_table, block_starts=None):
+    """Encode all eligible format 3/4 statements with array operations.
+
+    Returns {position in statements: object code}.
+    """
+    positions, columns = gather_format34(statements, base_registers, symbol_table, literal_table, block_starts)
+    if not len(positions):
+        return {}
+
+    opcode, extended, n, i, x = (columns[name] for name in ("opcode", "extended", "n", "i", "x"))
+    target, location, base = columns["target"], columns["location"], columns["base"]
+
+    # PC-relative first, then base-relative, then direct (as calculate_displacement does)
+    disp = target - (location + 3)
+    pc_relative = ~extended & (disp >= -2048) & (disp <= 2047)
+    base_disp = target - base
+    base_relative = ~extended & ~pc_relative & (base >= 0) & (base_disp >= 0) & (base_disp <= 4095)
+    field = np.where(pc_relative, disp, np.where(base_relative, base_disp, target)) & 0xFFF
+    # Targets no mode reaches are left to the scalar encoder, which reports them
+    direct = ~extended & ~pc_relative & ~base_relative
+    reachable = ~direct | ((target >= 0) & (target <= 0xFFF))
+
+    opcode_ni = opcode | (n << 1) | i
+    flags = (x << 3) | (base_relative.astype(np.int64) << 2) | (pc_relative.astype(np.int64) << 1) | extended
+
+    results = {}
+
+    short = ~extended & reachable
+    if short.any():
+        words = (opcode_ni[short] << 16) | (flags[short] << 12) | field[short]
+        text = words.astype('>u4').view(np.uint8).reshape(-1, 4)[:, 1:].tobytes().hex().upper()
+        results.update(zip(positions[short].tolist(), [text[k:k + 6] for k in range(0, len(text), 6)]))
+
+    if extended.any():
+        words = (opcode_ni[extended] << 24) | (flags[extended] << 20) | (target[extended] & 0xFFFFF)
+        text = words.astype('>u4').tobytes().hex().upper()
+        results.update(zip(positions[extended].tolist(), [text[k:k + 8] for k in range(0, len(text), 8)]))
+
+    return results
@@ -0,0 +1,129 @@
+import asyncio
+import io
+import os
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class OutputSink:
+    """Destination for the files produced while assembling a program.
+
+    Each write names the program (its output sub-directory) and the file,
+    e.g. write("input", "HTME.txt", text). text is bytes for binary outputs
+    such as debug.map.
+    """
+
+    # Number of writes the sink can safely handle at the same time
+    max_writers = 1
+
+    def write(self, program, name, text):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class MemorySink(OutputSink):
+    """Keeps outputs in a dict keyed by (program, name)"""
+
+    def __init__(self):
+        self.files = {}
+
+    def write(self, program, name, text):
+        self.files[(program, name)] = text
+
+    def read(self, program, name):
+        return self.files[(program, name)]
+
+
+class DirectorySink(OutputSink):
+    """Writes outputs to root/<program>/<name>, the layout main.py always used"""
+
+    max_writers = 4
+
+    def __init__(self, root):
+        self.root = root
+
+    def write(self, program, name, text):
+        output_dir = os.path.join(self.root, program)
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, name), 'wb' if isinstance(text, bytes) else 'w') as f:
+            f.write(text)
+
+
+class TarSink(OutputSink):
+    """Collects outputs as <program>/<name> members of a tar archive"""
+
+    def __init__(self, path, mode='w'):
+        self.path = path
+        self.archive = tarfile.open(path, mode)
+
+    def write(self, program, name, text):
+        data = text if isinstance(text, bytes) else text.encode()
+        info = tarfile.TarInfo(f"{program}/{name}")
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.archive.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self.archive.close()
+
+
+class AsyncSink(OutputSink):
+    """Wraps another sink and performs its writes on a background asyncio loop.
+
+    write() returns immediately, so the caller can assemble the next program
+    while earlier outputs are still being written. At most max_pending writes
+    are queued before write() waits for the oldest one. Errors from the
+    wrapped sink are raised by flush() or by a later write().
+    """
+
+    def __init__(self, sink, max_pending=64):
+        self.sink = sink
+        self.max_pending = max_pending
+        self.pending = []
+        self.executor = ThreadPoolExecutor(max_workers=sink.max_writers)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    async def _write(self, program, name, text):
+        await self.loop.run_in_executor(self.executor, self.sink.write, program, name, text)
+
+    def write(self, program, name, text):
+        future = asyncio.run_coroutine_threadsafe(self._write(program, name, text), self.loop)
+        self.pending.append(future)
+        if len(self.pending) >= self.max_pending:
+            done = [f for f in self.pending if f.done()]
+            self.pending = [f for f in self.pending if not f.done()]
+            for f in done:
+                f.result()
+            if len(self.pending) >= self.max_pending:
+                self.pending.pop(0).result()
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        for future in pending:
+            future.result()
+        self.sink.flush()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.executor.shutdown()
+            self.sink.close()
@@ -0,0 +1,80 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import AssemblyOptions, assemble_program
+from pass2.delta import load_image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def assemble(source, **options):
+    """Assemble source text with and without AssemblyOptions(**options); returns both output dicts"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "pool.txt")
+        with open(path, 'w') as f:
+            f.write(source)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return assemble_program(path), assemble_program(path, options=AssemblyOptions(**options))
+
+
+def image(outputs):
+    return load_image(io.StringIO(outputs["HTME.txt"]))
+
+
+class ConstantPoolTest(unittest.TestCase):
+
+    def test_duplicate_constant_is_pooled(self):
+        plain, pooled = assemble("POOL    START   0\n"
+                                 "FIRST   LDA     ONE\n"
+                                 "        ADD     ONEB\n"
+                                 "        J       FIRST\n"
+                                 "ONE     WORD    1\n"
+                                 "ONEB    WORD    1\n"
+                                 "        END     FIRST\n", constant_pooling=True)
+        self.assertIn("ONEB WORD 1 -> ONEB EQU ONE", pooled["rewrites.txt"])
+        # The same object code without the last word, and ADD now reads ONE
+        expected = image(plain)[:-3]
+        expected[3:6] = bytes.fromhex("1B2003")
+        self.assertEqual(image(pooled), expected)
+
+    def test_literal_keeps_its_first_spelling(self):
+        plain, pooled = assemble("POOL    START   0\n"
+                                 "FIRST   LDA     =C'EOF'\n"
+                                 "        COMP    =X'454F46'\n"
+                                 "        J       FIRST\n"
+                                 "        END     FIRST\n", constant_pooling=True)
+        self.assertIn("COMP =X'454F46' -> COMP =C'EOF'", pooled["rewrites.txt"])
+        self.assertNotIn("=X'454F46'\t", pooled["symbTable.txt"])
+        self.assertEqual(image(pooled), bytes.fromhex("032006" "2B2003" "3F2FF7" "454F46"))
+        self.assertEqual(image(plain)[:9], bytes.fromhex("032006" "2B2006" "3F2FF7"))
+
+    def test_program_without_duplicates_is_unchanged(self):
+        with open(os.path.join(ROOT, "input", "input2.txt")) as f:
+            plain, pooled = assemble(f.read(), constant_pooling=True)
+        self.assertNotIn("rewrites.txt", pooled)
+        self.assertEqual(pooled["HTME.txt"], plain["HTME.txt"])
+
+    def test_duplicate_out_of_range_is_kept(self):
+        plain, pooled = assemble("POOL    START   0\n"
+                                 "FIRST   +J      BEGIN\n"
+                                 "PAD     RESB    5000\n"
+                                 "BEGIN   LDA     K1\n"
+                                 "        +J      NEXT\n"
+                                 "K1      WORD    7\n"
+                                 "GAP     RESB    5000\n"
+                                 "NEXT    LDA     K2\n"
+                                 "        J       FIRST\n"
+                                 "K2      WORD    7\n"
+                                 "        END     FIRST\n", constant_pooling=True)
+        self.assertNotIn("rewrites.txt", pooled)
+        self.assertEqual(pooled["HTME.txt"], plain["HTME.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
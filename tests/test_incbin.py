@@ -0,0 +1,71 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import assemble_program
+from pass1.pass1 import AssemblerError
+from pass2.pass2 import pass2
+from pass2.Htme import generate_htme_records, extract_block_info
+
+DATA = bytes(range(40))
+
+
+class IncbinTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        source_dir = os.path.join(self.directory.name, "src")
+        os.makedirs(os.path.join(source_dir, "data"))
+        self.binary = os.path.join(source_dir, "data", "tab.bin")
+        with open(self.binary, 'wb') as f:
+            f.write(DATA)
+        self.source = os.path.join(source_dir, "prog.txt")
+        with open(self.source, 'w') as f:
+            f.write("PROG    START   0\n"
+                    "FIRST   LDA     TAB\n"
+                    "        RSUB\n"
+                    "TAB     INCBIN  data/tab.bin\n"
+                    "        END     FIRST\n")
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.outputs = assemble_program(self.source)
+        self.cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def htme_from_files(self):
+        """HTME built from intermediate.txt and symbTable.txt alone, without pass1's BinaryIncludes"""
+        symbols = io.StringIO(self.outputs["symbTable.txt"])
+        listing = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()):
+            pass2(io.StringIO(self.outputs["intermediate.txt"]), symbols, listing)
+            htme = io.StringIO()
+            generate_htme_records(listing.getvalue().splitlines(keepends=True), htme, extract_block_info(symbols))
+        return htme.getvalue()
+
+    def test_listing_holds_the_absolute_path(self):
+        self.assertIn(f"INCBIN   {self.binary}", self.outputs["intermediate.txt"])
+
+    def test_binary_data_in_text_records(self):
+        records = [line for line in self.outputs["HTME.txt"].splitlines() if line.startswith('T')]
+        self.assertIn(f"T.000006.1E.{DATA[:30].hex().upper()}", records)
+        self.assertIn(f"T.000024.0A.{DATA[30:].hex().upper()}", records)
+
+    def test_htme_reads_binaries_from_the_listing(self):
+        os.chdir(self.directory.name)
+        self.assertEqual(self.htme_from_files(), self.outputs["HTME.txt"])
+
+    def test_missing_binary_is_an_error(self):
+        os.remove(self.binary)
+        with self.assertRaisesRegex(AssemblerError, "Cannot read binary file"):
+            self.htme_from_files()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import AssemblyOptions, assemble_program
+from load_and_go import load_and_go
+from pass2.delta import load_image
+
+
+def generate_program(path, sections=6, statements=3000, reserve=60000, seed=7):
+    """Write a synthetic program of several hundred KB: code runs separated by large RESB areas"""
+    rng = random.Random(seed)
+    lines = ["BIG     START   0"]
+    labels = []
+    for section in range(sections):
+        for _ in range(statements):
+            choice = rng.random()
+            if labels and choice < 0.4:
+                lines.append(f"        +LDA    {rng.choice(labels)}")
+            elif labels and choice < 0.5:
+                lines.append(f"        +STA    {rng.choice(labels)}")
+            elif choice < 0.7:
+                lines.append("        ADDR    A,S")
+            else:
+                lines.append(f"        LDT     #{rng.randint(0, 4095)}")
+        lines.append(f"BUF{section:<5}RESB    {reserve}")
+        lines.append(f"W{section:<7}WORD    {section}")
+        labels += [f"BUF{section}", f"W{section}"]
+    lines.append(f"        +JSUB   W{sections - 1}")
+    lines.append("        END     BIG")
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+class LargeProgramTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.source = os.path.join(cls.directory.name, "big.txt")
+        generate_program(cls.source)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.outputs = assemble_program(cls.source)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_program_needs_more_than_16_bits(self):
+        header = self.outputs["HTME.txt"].splitlines()[0]
+        self.assertGreater(int(header.split('.')[3], 16), 0x50000)
+
+    def test_listing_locations_are_five_hex_digits(self):
+        for text in (self.outputs["intermediate.txt"], self.outputs["out_pass1.txt"]):
+            for line in text.splitlines():
+                self.assertRegex(line, r"^[0-9A-F]{5} \d")
+        last = self.outputs["intermediate.txt"].splitlines()[-1]
+        self.assertGreater(int(last[:5], 16), 0xFFFF)
+
+    def test_symbol_files_use_five_hex_digits(self):
+        section = self.outputs["symbTable.txt"].split("\nSymbol\tValue\n")[1].split("\n\n")[0]
+        for line in section.splitlines():
+            self.assertRegex(line, r"^\w+\t[0-9A-F]{5}$")
+        self.assertIn("W5\t", section)
+        for line in self.outputs["xref.txt"].splitlines()[1:]:
+            self.assertRegex(line.split('\t')[1], r"^[0-9A-F]{5}$")
+
+    def test_format4_addresses_are_20_bits(self):
+        symbols = dict(re.findall(r"^(\w+)\t([0-9A-F]{5})$", self.outputs["symbTable.txt"], re.MULTILINE))
+        checked = 0
+        for line in self.outputs["out_pass2.txt"].splitlines()[1:]:
+            fields = line.split()
+            if fields[2].startswith('+') and fields[3] in symbols:
+                self.assertEqual(fields[-1][-5:], symbols[fields[3]])
+                checked += 1
+        self.assertGreater(checked, 1000)
+
+    def test_text_records_match_load_and_go(self):
+        image = load_image(io.StringIO(self.outputs["HTME.txt"]))
+        program = load_and_go(self.source)
+        self.assertEqual(program.image, image[:len(program.image)])
+        self.assertFalse(any(image[len(program.image):]))
+
+
+def generate_multiblock_program(path, statements=400, reserve=400000):
+    """Write a program whose code and data sit in several USE blocks around a large CBLKS area"""
+    rng = random.Random(11)
+    lines = ["MULTI   START   0",
+             "FIRST   +JSUB   WORK"]
+    for _ in range(statements):
+        lines.append(rng.choice(["        +LDA    RESULT", "        LDA     COUNT", "        STA     TOTAL",
+                                 "        ADDR    A,S"]))
+    lines += ["        +STA    RESULT",
+              "        RSUB",
+              "        USE     CDATA",
+              "COUNT   WORD    3",
+              "TOTAL   WORD    0",
+              "        USE     DEFAULTB",
+              "WORK    LDA     VAL",
+              "        ADD     COUNT",
+              "        J       DONE",
+              "VAL     WORD    7",
+              "DONE    +STA    RESULT",
+              "        RSUB",
+              "        USE     CBLKS",
+              f"AREA    RESB    {reserve}",
+              "RESULT  RESW    1",
+              "AREAEND EQU     *",
+              "        END     FIRST"]
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+class MultiBlockProgramTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.source = os.path.join(cls.directory.name, "multi.txt")
+        generate_multiblock_program(cls.source)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.outputs = assemble_program(cls.source)
+        cls.symbols = dict(re.findall(r"^(\w+)\t([0-9A-F]{5})$", cls.outputs["symbTable.txt"], re.MULTILINE))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_header_length_is_the_end_of_the_last_block(self):
+        header = self.outputs["HTME.txt"].splitlines()[0]
+        blocks = re.findall(r"^CBLKS\t3\t([0-9A-F]{5})\t([0-9A-F]{5})$", self.outputs["symbTable.txt"], re.MULTILINE)
+        end = int(blocks[0][0], 16) + int(blocks[0][1], 16)
+        self.assertEqual(int(header.split('.')[3], 16), end)
+        self.assertEqual(int(self.symbols["AREAEND"], 16), end)
+        self.assertGreater(int(self.symbols["RESULT"], 16), 0x50000)
+
+    def test_text_records_use_absolute_addresses(self):
+        records = [line.split('.') for line in self.outputs["HTME.txt"].splitlines() if line.startswith('T')]
+        starts = {int(start, 16): code for _, start, _, code in records}
+        work = int(self.symbols["WORK"], 16)
+        self.assertIn(work, starts)
+        # LDA VAL inside DEFAULTB is PC-relative to VAL, nine bytes ahead
+        self.assertEqual(starts[work][:6], "032006")
+
+    def test_format4_addresses_reach_the_last_block(self):
+        for line in self.outputs["out_pass2.txt"].splitlines()[1:]:
+            fields = line.split()
+            if fields[-2:-1] == ["RESULT"] and fields[-3].startswith('+'):
+                self.assertEqual(fields[-1][-5:], self.symbols["RESULT"])
+
+    def test_text_records_match_load_and_go(self):
+        image = load_image(io.StringIO(self.outputs["HTME.txt"]))
+        program = load_and_go(self.source)
+        self.assertEqual(program.image, image[:len(program.image)])
+        self.assertFalse(any(image[len(program.image):]))
+
+
+class AddressRangeTest(unittest.TestCase):
+
+    def test_error_names_symbols(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "far.txt")
+            with open(source, 'w') as f:
+                f.write("PROG     START   0\n"
+                        "FIRST    LDA     #1\n"
+                        "         LDA     LEN\n"
+                        "BUF      RESB    70000\n"
+                        "LEN      WORD    5\n"
+                        "         END     PROG\n")
+            for options in ({}, {"vectorized": True}):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    with self.assertRaisesRegex(Exception, r"Error at 00003 \(FIRST\+3\): LDA LEN cannot reach "
+                                                           r"[0-9A-F]{5} \(LEN\)"):
+                        assemble_program(source, options=AssemblyOptions(**options))
+
+
+if __name__ == "__main__":
+    unittest.main()
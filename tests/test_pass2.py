@@ -0,0 +1,48 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import assemble_program
+from pass2.pass2 import pass2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Pass2FromFilesTest(unittest.TestCase):
+    """pass2 run on intermediate.txt and symbTable.txt alone matches the in-memory pipeline"""
+
+    def check(self, source):
+        with tempfile.TemporaryDirectory() as directory:
+            with contextlib.redirect_stdout(io.StringIO()):
+                outputs = assemble_program(source)
+            paths = {}
+            for name in ("intermediate.txt", "symbTable.txt"):
+                paths[name] = os.path.join(directory, name)
+                with open(paths[name], 'w') as f:
+                    f.write(outputs[name])
+            output = os.path.join(directory, "out_pass2.txt")
+            with contextlib.redirect_stdout(io.StringIO()):
+                pass2(paths["intermediate.txt"], paths["symbTable.txt"], output)
+            with open(output) as f:
+                self.assertEqual(f.read(), outputs["out_pass2.txt"])
+
+    def test_program_with_blocks_and_literals(self):
+        self.check(os.path.join(ROOT, "input", "input2.txt"))
+
+    def test_program_without_literals(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "small.txt")
+            with open(source, 'w') as f:
+                f.write("SMALL    START   0\n"
+                        "FIRST    LDA     FIRST\n"
+                        "         END     FIRST\n")
+            self.check(source)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import AssemblyOptions, assemble_program
+from pass1.peephole import RULES
+
+
+def assemble(source, **options):
+    """HTME and rewrite report of source text assembled with AssemblyOptions(**options)"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "prog.txt")
+        with open(path, 'w') as f:
+            f.write(source)
+        with contextlib.redirect_stdout(io.StringIO()):
+            outputs = assemble_program(path, options=AssemblyOptions(**options))
+    return outputs["HTME.txt"], outputs.get("rewrites.txt", "")
+
+
+def program(*lines):
+    return "\n".join(["PROG    START   0"] + list(lines) + ["        END     FIRST"]) + "\n"
+
+
+# For each rule, a program only that rule changes and the program it should become
+CASES = {
+    "redundant_load": (
+        program("FIRST   LDA     ONE", "        STA     TMP", "        LDA     TMP", "        RSUB",
+                "ONE     WORD    1", "TMP     RESW    1"),
+        program("FIRST   LDA     ONE", "        STA     TMP", "        RSUB",
+                "ONE     WORD    1", "TMP     RESW    1"),
+    ),
+    "jump_to_jump": (
+        program("FIRST   JEQ     HOP", "HOP     J       DONE", "DONE    LDA     #0", "        RSUB"),
+        program("FIRST   JEQ     DONE", "HOP     J       DONE", "DONE    LDA     #0", "        RSUB"),
+    ),
+    "clear_before_load": (
+        program("FIRST   CLEAR   A", "        LDA     ONE", "        RSUB", "ONE     WORD    1"),
+        program("FIRST   LDA     ONE", "        RSUB", "ONE     WORD    1"),
+    ),
+    "shorten_format4": (
+        program("FIRST   +LDA    VAL", "        RSUB", "        USE     CDATA", "VAL     WORD    1"),
+        program("FIRST   LDA     VAL", "        RSUB", "        USE     CDATA", "VAL     WORD    1"),
+    ),
+}
+
+
+class PeepholeTest(unittest.TestCase):
+
+    def test_each_rule_matches_the_rewritten_source(self):
+        for rule, (source, expected) in CASES.items():
+            with self.subTest(rule=rule):
+                htme, report = assemble(source, peephole=True)
+                self.assertEqual(htme, assemble(expected)[0])
+                self.assertEqual([line.split('\t')[0] for line in report.splitlines()[1:]], [rule])
+
+    def test_disabled_rule_leaves_object_code_identical(self):
+        for rule, (source, _) in CASES.items():
+            with self.subTest(rule=rule):
+                htme, report = assemble(source, peephole=True, disabled_rules=(rule,))
+                self.assertEqual(htme, assemble(source)[0])
+                self.assertEqual(report, "")
+
+    def test_all_rules_disabled(self):
+        for source, _ in CASES.values():
+            self.assertEqual(assemble(source, peephole=True, disabled_rules=tuple(RULES))[0], assemble(source)[0])
+
+    def test_clear_kept_when_the_load_reads_the_register(self):
+        for lines in (("FIRST   CLEAR   X", "        LDX     TAB,X"), ("FIRST   CLEAR   B", "        LDB     TAB")):
+            source = program(*lines, "        RSUB", "TAB     WORD    1")
+            with self.subTest(lines=lines):
+                self.assertEqual(assemble(source, peephole=True), assemble(source))
+
+    def test_jump_not_retargeted_out_of_range(self):
+        source = program("PAD     RESB    100", "FIRST   JEQ     HOP", "PAD1    RESB    2040",
+                         "HOP     J       FAR", "PAD2    RESB    2040", "FAR     LDA     #0", "        RSUB")
+        self.assertEqual(assemble(source, peephole=True), assemble(source))
+
+
+if __name__ == "__main__":
+    unittest.main()
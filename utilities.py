@@ -0,0 +1,22 @@
+from contextlib import contextmanager
+
+
+@contextmanager
+def open_input(source):
+    """Open source for reading; file-like objects are rewound and used as-is"""
+    if hasattr(source, 'read'):
+        source.seek(0)
+        yield source
+    else:
+        with open(source, 'r') as f:
+            yield f
+
+
+@contextmanager
+def open_output(target, mode='w'):
+    """Open target for writing; file-like objects are used as-is and left open"""
+    if hasattr(target, 'write'):
+        yield target
+    else:
+        with open(target, mode) as f:
+            yield f